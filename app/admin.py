@@ -0,0 +1,129 @@
+import anyio
+import hmac
+import os
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from typing import Optional
+from app.model import resolve_model_path
+from app.routers import (airport_service, cancellation_service, micro_batcher, model, model_registry, prediction_cache, reference_reloader,
+                         weather_cache, weather_shared_store)
+from app.schemas import ModelLoadInput
+
+# As rotas administrativas exigem o cabeçalho X-Admin-Token com este valor; sem ele, ficam fechadas
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Rotas administrativas desativadas: defina ADMIN_TOKEN.")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Token administrativo inválido.")
+
+
+router = APIRouter(
+    prefix='/api/admin',
+    tags=['admin'],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+@router.post(path="/reload")
+
+async def reload_reference_data():
+    """
+    Recarrega aeroportos e taxas de cancelamento no worker que recebeu a requisição; os demais
+    recarregam pela verificação periódica dos arquivos (ReferenceDataReloader).
+    """
+    try:
+        reloaded = await reference_reloader.reload_all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro ao recarregar os dados de referência (dados atuais mantidos): {e}")
+
+    return {
+        "recarregados": reloaded,
+        "aeroportos": len(airport_service.table),
+        "taxas_cancelamento": {
+            "airline": len(cancellation_service.airline_rates),
+            "origin": len(cancellation_service.origin_rates),
+            "route": len(cancellation_service.route_rates),
+        },
+        "versao_taxas": cancellation_service.version,
+    }
+
+
+@router.get(path="/cache")
+
+async def get_cache_stats():
+    """Estatísticas dos caches meteorológicos (em memória e compartilhado) e de previsões."""
+    return {
+        "clima": weather_cache.stats(),
+        "previsoes": prediction_cache.stats(),
+        "clima_compartilhado": weather_shared_store.stats() if weather_shared_store is not None else None,
+    }
+
+
+@router.get(path="/model")
+
+async def get_model_versions():
+    """
+    Versões ativa, anterior e sombra do modelo neste worker, com as estatísticas da sombra, do
+    micro-batching e a geração do registro aplicada.
+    """
+    return {**model.describe(), "micro_batching": micro_batcher.describe(), "registro": model_registry.describe()}
+
+
+@router.post(path="/model/load")
+
+async def load_model_version(input: ModelLoadInput):
+    """
+    Carrega e aquece um artefato em segundo plano e então o ativa (troca atômica, a versão atual fica
+    disponível para rollback) ou o coloca em modo sombra.
+    """
+    try:
+        path = resolve_model_path(input.arquivo)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        candidate = await anyio.to_thread.run_sync(model.load_version, path)
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Artefato inválido (modelo atual mantido): {e}")
+
+    if input.modo == "sombra":
+        model.set_shadow(candidate, input.amostragem)
+    else:
+        model.activate(candidate)
+    model_registry.publish()
+    return model.describe()
+
+
+@router.post(path="/model/rollback")
+
+async def rollback_model():
+    """Volta imediatamente para a versão anterior do modelo."""
+    try:
+        model.rollback()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    model_registry.publish()
+    return model.describe()
+
+
+@router.post(path="/model/shadow/promote")
+
+async def promote_shadow_model():
+    """Ativa o modelo sombra."""
+    try:
+        model.promote_shadow()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    model_registry.publish()
+    return model.describe()
+
+
+@router.delete(path="/model/shadow")
+
+async def clear_shadow_model():
+    """Remove o modelo sombra."""
+    model.clear_shadow()
+    model_registry.publish()
+    return model.describe()
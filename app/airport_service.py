@@ -1,27 +1,184 @@
+import anyio
+import asyncio
+import re
+import threading
+import time
 import pandas as pd
 import httpx
+from collections import deque
+from typing import Dict, NamedTuple, Optional, Tuple
+from app.cache import TTLCache
+from app.reference_tables import ReferenceTable, compiled_table_path, load_table
+from app.spatial_index import AirportIndex, snap_to_grid
+
+# Códigos IATA (3) ou ICAO (4) aceitos para a consulta paga à AeroAPI
+AIRPORT_CODE_PATTERN = re.compile(r"[A-Z0-9]{3,4}")
+
+
+class AirportSnapshot(NamedTuple):
+    """
+    Tabela, índice espacial e apelidos de uma mesma carga do CSV. Nunca é alterado: recargas e apelidos
+    novos criam outro snapshot, trocado em uma única atribuição, e cada consulta lê um só snapshot.
+    """
+    table: ReferenceTable
+    index: AirportIndex
+    # Códigos fora do CSV -> aeroporto do CSV mais próximo (ver resolve)
+    aliases: Dict[str, str]
+
+    def lookup_code(self, ident: str) -> str:
+        code = ident.upper()
+        return self.aliases.get(code, code)
+
+    def is_known(self, ident: str) -> bool:
+        code = ident.upper()
+        return code in self.aliases or code in self.table
+
 
 class AirportService:
-    def __init__(self, csv_path: str, api_key: str):
-        self.df = pd.read_csv(csv_path)
-        self.df["airport_code"] = self.df["airport_code"].astype(str).str.upper()
-        self.airports = {
-            row["airport_code"]: {
-                "lat": float(row["latitude"]),
-                "lon": float(row["longitude"]),
-            }
-            for _, row in self.df.iterrows()
-        }
+    def __init__(self, csv_path: str, api_key: str, load: bool = True, grid_resolution: float = 0.0,
+                 nearest_max_km: float = 50.0, max_lookups: int = 30, lookup_window: float = 60.0):
+        self.csv_path = csv_path
         self.api_key = api_key
+        # Resolução (graus) da grade do clima; aeroportos na mesma célula compartilham o clima
+        self.grid_resolution = grid_resolution
+        # Distância máxima até o aeroporto do CSV usado no lugar de um código desconhecido
+        self.nearest_max_km = nearest_max_km
+        self._snapshot: Optional[AirportSnapshot] = None
+        # Serializa as trocas de snapshot: recarga (em uma thread) e publicação de apelidos (no event loop)
+        self._swap_lock = threading.Lock()
+        self._unresolved = TTLCache(ttl=3600, maxsize=10000)
+        # Consultas à AeroAPI (pagas): uma por código em andamento, no máximo max_lookups a cada lookup_window segundos
+        self.max_lookups = max_lookups
+        self.lookup_window = lookup_window
+        self._lookups_inflight = {}
+        self._lookup_times = deque()
+        self.lookups = 0
+        self.lookups_rejected = 0
+        # Com load=False a tabela só é lida em load() (ex: na inicialização da API, fora do import)
+        if load:
+            self.load()
+
+    def load(self):
+        # Tabela compacta (códigos ordenados + lat/lon float32), com memory-map se compilada
+        table = load_table(self.csv_path, "airport_code", ["latitude", "longitude"])
+        # Apelidos zerados: um código antes desconhecido pode ter entrado no CSV
+        snapshot = AirportSnapshot(table, AirportIndex.from_table(table), {})
+        with self._swap_lock:
+            self._snapshot = snapshot
+        self._unresolved.clear()
+
+    @property
+    def table(self) -> ReferenceTable:
+        return self._snapshot.table
+
+    @property
+    def index(self) -> AirportIndex:
+        return self._snapshot.index
+
+    @property
+    def aliases(self) -> Dict[str, str]:
+        return self._snapshot.aliases
+
+    def reload(self):
+        """Recarrega a tabela de aeroportos (e o índice espacial) e a troca atomicamente."""
+        self.load()
 
+    def source_paths(self):
+        """Arquivos de origem dos aeroportos (CSV e tabela compilada), para detectar alterações."""
+        return [self.csv_path, compiled_table_path(self.csv_path)]
 
-    def get_coordinates_archive(self, ident: str):
+
+    def get_coordinates_archive(self, ident: str, snapshot: Optional[AirportSnapshot] = None):
+        # Um único snapshot durante toda a busca, mesmo se houver uma recarga
+        snapshot = snapshot or self._snapshot
+        code = snapshot.lookup_code(ident)
+
+        table = snapshot.table
+        i = table.index(code)
+        if i < 0:
+            raise ValueError(f"Aeroporto {code} não encontrado no CSV")
+
+        # Arredonda para desfazer o ruído do float32 (~1 m de precisão)
+        return {
+            "lat": round(float(table.data["latitude"][i]), 5),
+            "lon": round(float(table.data["longitude"][i]), 5),
+        }
+
+    def weather_cell(self, ident: str) -> Tuple[float, float]:
+        """Ponto da grade do clima do aeroporto: (lat, lon) usados na chave do cache e na consulta."""
+        coords = self.get_coordinates_archive(ident)
+        return snap_to_grid(coords["lat"], coords["lon"], self.grid_resolution)
+
+    def is_known(self, ident: str) -> bool:
+        return self._snapshot.is_known(ident)
+
+    def nearest_airport(self, lat: float, lon: float, snapshot: Optional[AirportSnapshot] = None) -> Optional[Tuple[str, float]]:
+        """(código, distância em km) do aeroporto do CSV mais próximo, até nearest_max_km."""
+        return (snapshot or self._snapshot).index.nearest(lat, lon, self.nearest_max_km)
+
+    async def resolve(self, ident: str) -> Optional[dict]:
+        """
+        Coordenadas do aeroporto. Um código fora do CSV é localizado na AeroAPI (se MY_AEROAPI_KEY
+        estiver configurada) e passa a usar o aeroporto do CSV mais próximo, a até nearest_max_km.
+        Requisições simultâneas pelo mesmo código compartilham uma única consulta, e as consultas
+        novas são limitadas a max_lookups por lookup_window segundos.
+        Retorna None se o aeroporto não puder ser resolvido (ou se o limite de consultas foi atingido).
+        """
         code = ident.upper()
+        snapshot = self._snapshot
+        if snapshot.is_known(code):
+            return self.get_coordinates_archive(code, snapshot)
+        if not self.api_key or not AIRPORT_CODE_PATTERN.fullmatch(code) or self._unresolved.get(code):
+            return None
+
+        task = self._lookups_inflight.get(code)
+        if task is None:
+            if not self._take_lookup():
+                self.lookups_rejected += 1
+                print(f"--- Limite de {self.max_lookups} consultas à AeroAPI em {self.lookup_window:.0f}s atingido; {code} não resolvido ---")
+                return None
+            task = asyncio.ensure_future(self._lookup(code))
+            self._lookups_inflight[code] = task
+            task.add_done_callback(lambda _: self._lookups_inflight.pop(code, None))
+
+        # shield: o cancelamento de um chamador não cancela a consulta compartilhada
+        return await asyncio.shield(task)
+
+    def _take_lookup(self) -> bool:
+        # Janela deslizante: descarta as consultas mais antigas que lookup_window segundos
+        now = time.monotonic()
+        while self._lookup_times and now - self._lookup_times[0] >= self.lookup_window:
+            self._lookup_times.popleft()
+        if len(self._lookup_times) >= self.max_lookups:
+            return False
+        self._lookup_times.append(now)
+        self.lookups += 1
+        return True
+
+    async def _lookup(self, code: str) -> Optional[dict]:
+        # Localiza code na AeroAPI e o associa ao aeroporto do CSV mais próximo
+        online = await anyio.to_thread.run_sync(self.get_coordinates_online, code)
+        # Índice e tabela da mesma carga, mesmo se houver uma recarga durante a consulta
+        snapshot = self._snapshot
+        table_used = snapshot.table
+        nearest = self.nearest_airport(float(online["latitude"]), float(online["longitude"]), snapshot) if online else None
+        if nearest is None:
+            self._unresolved.set(code, True)
+            return None
 
-        if code not in self.airports:
-            raise ValueError("Aeroporto {code} não encontrado no CSV")
+        nearest_code, distance_km = nearest
+        print(f"--- Aeroporto {code} fora do CSV; usando {nearest_code} ({distance_km:.1f} km) ---")
+        with self._swap_lock:
+            current = self._snapshot
+            snapshot = current._replace(aliases={**current.aliases, code: nearest_code})
+            if current.table is table_used:
+                # Sem recarga no meio do caminho: publica o apelido (uma recarga posterior o descarta)
+                self._snapshot = snapshot
+        return self.get_coordinates_archive(code, snapshot)
 
-        return self.airports[code]
+    def airport_codes(self):
+        """Códigos de todos os aeroportos conhecidos."""
+        return self.table.code_list()
     
     
 
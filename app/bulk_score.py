@@ -0,0 +1,195 @@
+"""
+Pontuação em massa de grades de voos (históricas ou planejadas), fora do serviço HTTP.
+
+    python -m app.bulk_score grade.parquet previsoes.parquet
+    python -m app.bulk_score grade.csv previsoes.csv --workers 8 --chunk-size 20000
+
+O arquivo de entrada (CSV ou Parquet) precisa das colunas companhia, origem, destino e data_partida.
+O clima é buscado uma única vez por (ponto da grade, hora UTC) com as chamadas multi-localização da API; a
+construção das features e o predict_proba são divididos em blocos entre os processos de um pool. A
+saída repete as colunas de entrada e acrescenta previsao, probabilidade e erro, com os mesmos valores
+que a rota /api/predict/batch retornaria.
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+import pandas as pd
+from pydantic import ValidationError
+from app.airport_service import AirportService
+from app.cache import TTLCache
+from app.cancel_rate import CancellationRate
+from app.features import build_features_batch
+from app.model import MODEL_PATH, FlightDelayModel
+from app.reference_tables import DATA_DIR
+from app.schemas import FlightInput
+from app.weather_client import AsyncWeatherClient
+from app.weather_service import WeatherService, to_utc
+
+INPUT_COLUMNS = ["companhia", "origem", "destino", "data_partida"]
+# Mesma grade do clima da API (ver app/routers.py)
+WEATHER_GRID_RESOLUTION = float(os.environ.get('WEATHER_GRID_RESOLUTION', '0.1'))
+
+# Estado de cada processo do pool, montado uma vez por init_worker
+_worker = {}
+
+
+def read_flights(path) -> pd.DataFrame:
+    path = Path(path)
+    if path.suffix.lower() == ".parquet":
+        return pd.read_parquet(path)
+    # Lido como texto, para que data_partida seja interpretada pelo FlightInput como na API
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def write_predictions(df: pd.DataFrame, path):
+    path = Path(path)
+    if path.suffix.lower() == ".parquet":
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+
+def validate_flights(df: pd.DataFrame):
+    """Valida cada linha como FlightInput. Retorna (voos válidos ou None, mensagens de erro ou None)."""
+    missing = [column for column in INPUT_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas ausentes no arquivo de entrada: {', '.join(missing)}")
+
+    flights, errors = [], []
+    for record in df[INPUT_COLUMNS].to_dict("records"):
+        try:
+            flights.append(FlightInput.model_validate(record))
+            errors.append(None)
+        except ValidationError as e:
+            flights.append(None)
+            errors.append("; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()))
+    return flights, errors
+
+
+def flight_weather_key(flight: FlightInput) -> tuple:
+    """(origem, hora UTC da partida): voos com a mesma chave usam as mesmas features meteorológicas."""
+    return flight.origem.upper(), to_utc(flight.data_partida).replace(minute=0, second=0, microsecond=0)
+
+
+async def fetch_weather(airport_service: AirportService, flights: List[Optional[FlightInput]]) -> dict:
+    """
+    Features meteorológicas de cada (origem, hora UTC) distinta, por flight_weather_key. None se falhou;
+    origens que não puderam ser resolvidas ficam de fora.
+    As origens são resolvidas como na API (AirportService.resolve: CSV, apelidos e, com MY_AEROAPI_KEY,
+    o aeroporto do CSV mais próximo); origens no mesmo ponto da grade do clima compartilham a consulta
+    (ver WeatherService).
+    """
+    known = set()
+    for origem in {flight.origem.upper() for flight in flights if flight is not None}:
+        try:
+            if await airport_service.resolve(origem) is not None:
+                known.add(origem)
+        except Exception as e:
+            print(f"--- Erro ao resolver o aeroporto {origem}: {e} ---")
+
+    requests = {}
+    for flight in flights:
+        if flight is not None and flight.origem.upper() in known:
+            requests.setdefault(flight_weather_key(flight), (flight.origem, flight.data_partida))
+
+    weather_client = AsyncWeatherClient()
+    service = WeatherService(airport_service, weather_client, TTLCache(ttl=float("inf"), maxsize=len(requests) + 1))
+    try:
+        results = await service.get_weather_features_bulk(list(requests.values()), fallback=False)
+    finally:
+        await weather_client.aclose()
+    return dict(zip(requests, results))
+
+
+def init_worker(model_path, data_dir, weather_by_key: dict):
+    """Carrega o modelo e as taxas de cancelamento uma vez por processo."""
+    data_dir = Path(data_dir)
+    _worker["model"] = FlightDelayModel(Path(model_path))
+    _worker["cancellation_service"] = CancellationRate(
+        airline_csv_file_path=data_dir / "ops_airline.csv",
+        origin_csv_file_path=data_dir / "ops_origin.csv",
+        route_csv_file_path=data_dir / "ops_route.csv",
+    )
+    _worker["weather_by_key"] = weather_by_key
+
+
+def score_chunk(flights: List[Optional[FlightInput]]) -> List[tuple]:
+    """Pontua um bloco de voos já validados. Retorna (previsao, probabilidade, erro) por voo."""
+    weather_by_key = _worker["weather_by_key"]
+    results = [(None, None, None)] * len(flights)
+
+    scored, weather_features = [], []
+    for index, flight in enumerate(flights):
+        if flight is None:
+            continue
+        key = flight_weather_key(flight)
+        if key not in weather_by_key:
+            results[index] = (None, None, f"Coordenadas do aeroporto {flight.origem} não encontradas.")
+            continue
+        weather = weather_by_key[key]
+        if weather is None:
+            results[index] = (None, None, f"Não foi possível obter o clima do aeroporto {flight.origem}.")
+            continue
+        scored.append(index)
+        weather_features.append(weather)
+
+    if scored:
+        # Mesmo caminho da rota /api/predict/batch: features em colunas e uma única chamada ao modelo
+        features = build_features_batch([flights[i] for i in scored], _worker["cancellation_service"], weather_features)
+        for index, prediction in zip(scored, _worker["model"].predict_batch(features)):
+            results[index] = (prediction["prediction"], prediction["probability"], None)
+    return results
+
+
+def score_flights(df: pd.DataFrame, workers: int = os.cpu_count(), chunk_size: int = 10000,
+                  model_path=MODEL_PATH, data_dir=DATA_DIR) -> pd.DataFrame:
+    """Pontua todas as linhas de df; retorna df com as colunas previsao, probabilidade e erro."""
+    flights, errors = validate_flights(df)
+
+    airport_service = AirportService(Path(data_dir) / "airports_lat_lon.csv", os.environ.get('MY_AEROAPI_KEY'),
+                                     grid_resolution=WEATHER_GRID_RESOLUTION)
+    weather_by_key = asyncio.run(fetch_weather(airport_service, flights))
+
+    chunks = [flights[offset:offset + chunk_size] for offset in range(0, len(flights), chunk_size)]
+    if workers <= 1:
+        init_worker(model_path, data_dir, weather_by_key)
+        chunk_results = map(score_chunk, chunks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                       initargs=(model_path, data_dir, weather_by_key))
+        with executor:
+            chunk_results = list(executor.map(score_chunk, chunks))
+
+    results = [result for chunk in chunk_results for result in chunk]
+    output = df.copy()
+    output["previsao"] = [previsao for previsao, _, _ in results]
+    output["probabilidade"] = [probabilidade for _, probabilidade, _ in results]
+    output["erro"] = [validation_error or error for validation_error, (_, _, error) in zip(errors, results)]
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("entrada", help="arquivo de voos (.csv ou .parquet)")
+    parser.add_argument("saida", help="arquivo de previsões (.csv ou .parquet)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processos do pool (padrão: número de CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=10000, help="voos por bloco enviado a um processo")
+    parser.add_argument("--model", default=str(MODEL_PATH), help="artefato .joblib do modelo")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = read_flights(args.entrada)
+    output = score_flights(df, workers=args.workers, chunk_size=args.chunk_size, model_path=args.model)
+    write_predictions(output, args.saida)
+
+    elapsed = time.perf_counter() - start
+    n_errors = int(output["erro"].notna().sum())
+    print(f"{len(output)} voos pontuados em {elapsed:.1f}s ({len(output) / elapsed:.0f} voos/s), {n_errors} com erro -> {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
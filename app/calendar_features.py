@@ -0,0 +1,177 @@
+"""
+Tabela de calendário pré-calculada para as features base: faixa horária, dia da semana, mês,
+horário de pico, fim de semana, feriado e feriado prolongado.
+
+As flags de cada data de CALENDAR_YEARS e de cada hora são calculadas uma vez, de forma vetorizada;
+build_base_features consulta a tabela pelo ordinal da data e pela hora (sem strftime) e a versão em
+lote indexa os arrays diretamente. Datas fora do intervalo são calculadas na hora, com as mesmas regras.
+
+Configuração (variáveis de ambiente):
+    CALENDAR_PEAK_HOURS     horas de pico, ex: "6,7,8,9" (padrão)
+    CALENDAR_HOLIDAYS_FILE  CSV de feriados com as colunas data e regiao (opcional, ver load_holidays);
+                            sem ele valem os feriados fixos de DEFAULT_HOLIDAYS
+    CALENDAR_REGION         região cujos feriados regionais se somam aos nacionais (ex: "RJ")
+    CALENDAR_YEARS          anos pré-calculados, ex: "2015-2035" (padrão)
+"""
+import os
+from datetime import date, datetime
+from typing import Iterable, Set, Tuple
+import numpy as np
+import pandas as pd
+
+# Feriados fixos (MM-DD) usados quando não há arquivo de feriados configurado
+DEFAULT_HOLIDAYS = {"01-01", "12-25"}
+
+PEAK_HOURS = tuple(sorted({int(hour) for hour in os.environ.get("CALENDAR_PEAK_HOURS", "6,7,8,9").split(",") if hour.strip()}))
+HOLIDAYS_FILE = os.environ.get("CALENDAR_HOLIDAYS_FILE", "")
+CALENDAR_REGION = os.environ.get("CALENDAR_REGION", "").strip().upper()
+CALENDAR_YEARS = tuple(int(year) for year in os.environ.get("CALENDAR_YEARS", "2015-2035").split("-"))
+
+
+def hour_to_bucket(hour: int) -> int:
+    if 0 <= hour < 6:
+        return 0  # madrugada
+    elif 6 <= hour < 12:
+        return 1  # manhã
+    elif 12 <= hour < 18:
+        return 2  # tarde
+    else:
+        return 3  # noite
+
+
+def load_holidays(path, region: str = "") -> Tuple[Set[str], Set[date]]:
+    """
+    Lê um CSV de feriados com as colunas data e regiao (e outras colunas livres, ex: nome).
+    data é "MM-DD" para feriados fixos ou "AAAA-MM-DD" para datas específicas (ex: Carnaval);
+    linhas com regiao vazia valem para todas as regiões, as demais só para a região configurada.
+    Retorna (feriados fixos MM-DD, datas específicas).
+    """
+    df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if "regiao" not in df.columns:
+        df["regiao"] = ""
+
+    recurring, dated = set(), set()
+    for value, holiday_region in zip(df["data"].str.strip(), df["regiao"].str.strip().str.upper()):
+        if holiday_region and holiday_region != region:
+            continue
+        if len(value) == 5:
+            datetime.strptime(value, "%m-%d")  # valida o formato
+            recurring.add(value)
+        else:
+            dated.add(date.fromisoformat(value))
+    return recurring, dated
+
+
+class CalendarTable:
+    """Flags de calendário pré-calculadas por dia (a partir de first_day) e por hora do dia."""
+
+    def __init__(self, first_day: date, n_days: int, recurring_holidays: Iterable[str] = DEFAULT_HOLIDAYS,
+                 dated_holidays: Iterable[date] = (), peak_hours: Iterable[int] = PEAK_HOURS):
+        self.first_day = first_day
+        self.first_ordinal = first_day.toordinal()
+        self.n_days = n_days
+        self.recurring_holidays = set(recurring_holidays)
+        self.dated_holidays = set(dated_holidays)
+        self.peak_hours = tuple(peak_hours)
+
+        self._recurring_keys = [int(key.replace("-", "")) for key in self.recurring_holidays]
+        self._dated_keys = np.array(sorted(self.dated_holidays), dtype="datetime64[D]")
+
+        days = np.arange(np.datetime64(first_day, "D"), np.datetime64(first_day, "D") + n_days)
+        flags = self._day_flags(days)
+        self.day_of_week = flags["day_of_week"]
+        self.month = flags["month"]
+        self.is_weekend = flags["is_weekend"]
+        self.is_holiday = flags["is_holiday"]
+        self.is_long_weekend = flags["is_long_weekend"]
+
+        hours = np.arange(24)
+        self.hour_bucket = np.array([hour_to_bucket(hour) for hour in hours], dtype=np.int64)
+        self.is_peak_hour = np.isin(hours, self.peak_hours).astype(np.int64)
+
+        # Cópias em tuplas Python para a consulta de um voo (indexar listas é mais rápido que arrays NumPy)
+        self._day_rows = list(zip(self.day_of_week.tolist(), self.month.tolist(), self.is_weekend.tolist(),
+                                  self.is_holiday.tolist(), self.is_long_weekend.tolist()))
+        self._hour_rows = list(zip(self.hour_bucket.tolist(), self.is_peak_hour.tolist()))
+
+    @classmethod
+    def for_years(cls, first_year: int, last_year: int, **kwargs) -> "CalendarTable":
+        first_day = date(first_year, 1, 1)
+        return cls(first_day, date(last_year + 1, 1, 1).toordinal() - first_day.toordinal(), **kwargs)
+
+    @classmethod
+    def from_env(cls) -> "CalendarTable":
+        """Tabela configurada pelas variáveis CALENDAR_*."""
+        recurring, dated = DEFAULT_HOLIDAYS, set()
+        if HOLIDAYS_FILE:
+            recurring, dated = load_holidays(HOLIDAYS_FILE, CALENDAR_REGION)
+        first_year, last_year = CALENDAR_YEARS[0], CALENDAR_YEARS[-1]
+        return cls.for_years(first_year, last_year, recurring_holidays=recurring, dated_holidays=dated)
+
+    def _day_flags(self, days: np.ndarray) -> dict:
+        # Flags por dia de um array datetime64[D] qualquer (também usado para datas fora do intervalo)
+        months = days.astype("datetime64[M]")
+        # 1970-01-01 (dia 0) foi uma quinta-feira (weekday 3)
+        day_of_week = (days.astype(np.int64) + 3) % 7
+        month = months.astype(np.int64) % 12 + 1
+        month_day = month * 100 + (days - months).astype(np.int64) + 1
+
+        is_weekend = (day_of_week >= 5).astype(np.int64)
+        is_holiday = (np.isin(month_day, self._recurring_keys) | np.isin(days, self._dated_keys)).astype(np.int64)
+        return {
+            "day_of_week": day_of_week,
+            "month": month,
+            "is_weekend": is_weekend,
+            "is_holiday": is_holiday,
+            # Mesma regra usada no treino do modelo: feriado que cai no fim de semana
+            "is_long_weekend": is_holiday & is_weekend,
+        }
+
+    def lookup(self, dt: datetime) -> dict:
+        """Features de calendário de uma partida (horário de parede)."""
+        i = dt.toordinal() - self.first_ordinal
+        if 0 <= i < self.n_days:
+            day_of_week, month, is_weekend, is_holiday, is_long_weekend = self._day_rows[i]
+        else:
+            flags = self._day_flags(np.array([dt.date()], dtype="datetime64[D]"))
+            day_of_week, month, is_weekend, is_holiday, is_long_weekend = (
+                int(flags[name][0]) for name in ("day_of_week", "month", "is_weekend", "is_holiday", "is_long_weekend"))
+        hour_bucket, is_peak_hour = self._hour_rows[dt.hour]
+
+        return {
+            "hour_bucket": hour_bucket,
+            "day_of_week": day_of_week,
+            "month": month,
+            "is_peak_hour": is_peak_hour,
+            "is_weekend": is_weekend,
+            "is_holiday": is_holiday,
+            "is_long_weekend": is_long_weekend,
+        }
+
+    def lookup_batch(self, departures: np.ndarray) -> dict:
+        """Versão vetorizada de lookup: recebe datetime64 (horário de parede) e retorna um array por feature."""
+        departures = np.asarray(departures, dtype="datetime64[s]")
+        days = departures.astype("datetime64[D]")
+        hours = (departures - days).astype("timedelta64[h]").astype(np.int64)
+
+        index = days.astype(np.int64) - (self.first_ordinal - date(1970, 1, 1).toordinal())
+        outside = (index < 0) | (index >= self.n_days)
+
+        result = {
+            "hour_bucket": self.hour_bucket[hours],
+            "is_peak_hour": self.is_peak_hour[hours],
+        }
+        for name in ("day_of_week", "month", "is_weekend", "is_holiday", "is_long_weekend"):
+            result[name] = getattr(self, name)[np.where(outside, 0, index)]
+        if outside.any():
+            # Só os dias distintos fora do intervalo são calculados (o custo não depende da distância entre as datas)
+            unique_days, inverse = np.unique(days[outside], return_inverse=True)
+            flags = self._day_flags(unique_days)
+            for name, values in flags.items():
+                result[name][outside] = values[inverse]
+
+        return {name: result[name] for name in
+                ("hour_bucket", "day_of_week", "month", "is_peak_hour", "is_weekend", "is_holiday", "is_long_weekend")}
+
+
+calendar_table = CalendarTable.from_env()
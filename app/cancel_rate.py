@@ -1,43 +1,116 @@
 # app/cancel_rate.py
 import pandas as pd
-from typing import Dict
+from typing import NamedTuple
+from app.reference_tables import ReferenceTable, compiled_table_path, load_table
+
+
+class RateTables(NamedTuple):
+    airline: ReferenceTable
+    origin: ReferenceTable
+    route: ReferenceTable
+
 
 class CancellationRate:
-    def __init__(self, airline_csv_file_path: str, origin_csv_file_path: str, route_csv_file_path: str):
-        # Carrega os CSVs na inicialização e os armazena como dicionários para busca rápida
-        self.airline_rates = self._load_rates(airline_csv_file_path, 'airline', 'cancel_rate_airline_30d')
-        self.origin_rates = self._load_rates(origin_csv_file_path, 'origin', 'cancel_rate_origin_30d')
-        self.route_rates = self._load_rates(route_csv_file_path, 'route', 'cancel_rate_route_30d')
+    def __init__(self, airline_csv_file_path: str, origin_csv_file_path: str, route_csv_file_path: str, load: bool = True):
+        self.airline_csv_file_path = airline_csv_file_path
+        self.origin_csv_file_path = origin_csv_file_path
+        self.route_csv_file_path = route_csv_file_path
+        # Incrementada a cada recarga, para quem precisa invalidar resultados derivados das taxas
+        self.version = 0
+        self._rates = None
+        # Com load=False as tabelas só são lidas em load() (ex: na inicialização da API, fora do import)
+        if load:
+            self.load()
+
+    def load(self):
+        # Carrega as tabelas (compiladas com memory-map, se existirem, ou os CSVs)
+        self._rates = self._load_all()
+
+    def _load_all(self, strict: bool = False) -> RateTables:
+        return RateTables(
+            airline=self._load_rates(self.airline_csv_file_path, 'airline', 'cancel_rate_airline_30d', strict),
+            origin=self._load_rates(self.origin_csv_file_path, 'origin', 'cancel_rate_origin_30d', strict),
+            route=self._load_rates(self.route_csv_file_path, 'route', 'cancel_rate_route_30d', strict),
+        )
+
+    def reload(self):
+        """
+        Recarrega as três tabelas e as troca de uma só vez. As tabelas novas são montadas por completo
+        antes da troca (uma única atribuição), então as buscas em andamento nunca veem uma tabela parcial.
+        Se algum arquivo falhar, a exceção é propagada e as tabelas atuais são mantidas.
+        """
+        rates = self._load_all(strict=True)
+        self._rates = rates
+        self.version += 1
 
-    def _load_rates(self, file_path: str, key_col: str, rate_col: str) -> Dict[str, float]:
+    def source_paths(self):
+        """Arquivos de origem das taxas (CSVs e tabelas compiladas), para detectar alterações."""
+        return [path for csv_path in (self.airline_csv_file_path, self.origin_csv_file_path, self.route_csv_file_path)
+                for path in (csv_path, compiled_table_path(csv_path))]
+
+    @property
+    def airline_rates(self) -> ReferenceTable:
+        return self._rates.airline
+
+    @property
+    def origin_rates(self) -> ReferenceTable:
+        return self._rates.origin
+
+    @property
+    def route_rates(self) -> ReferenceTable:
+        return self._rates.route
+
+    def _load_rates(self, file_path: str, key_col: str, rate_col: str, strict: bool = False) -> ReferenceTable:
         """
-        Carrega um arquivo CSV e retorna um dicionário de taxas.
+        Carrega as taxas de um CSV (ou da sua tabela compilada) e retorna uma ReferenceTable.
         Espera que o CSV tenha uma coluna 'key_col' e uma coluna 'rate_col'.
+        Com strict=True os erros são propagados em vez de retornar uma tabela vazia.
         """
         try:
-            df = pd.read_csv(file_path)
-            if key_col not in df.columns or rate_col not in df.columns:
-                print(f"Erro: Colunas '{key_col}' ou '{rate_col}' não encontradas em {file_path}")
-                return {}
-            # Converte para maiúsculas para correspondência consistente
-            df[key_col] = df[key_col].astype(str).str.upper()
-            # Cria um dicionário para busca rápida, preenchendo NaN com 0.0
-            return df.set_index(key_col)[rate_col].fillna(0.0).to_dict()
+            # Códigos em maiúsculas para correspondência consistente e NaN preenchido com 0.0
+            return load_table(file_path, key_col, [rate_col], fill_value=0.0)
         except FileNotFoundError:
+            if strict:
+                raise
             print(f"Erro: O arquivo {file_path} não foi encontrado.")
-            return {}
+            return ReferenceTable.empty([rate_col])
+        except KeyError:
+            if strict:
+                raise
+            print(f"Erro: Colunas '{key_col}' ou '{rate_col}' não encontradas em {file_path}")
+            return ReferenceTable.empty([rate_col])
         except Exception as e:
+            if strict:
+                raise
             print(f"Ocorreu um erro ao ler o arquivo {file_path}: {e}")
-            return {}
+            return ReferenceTable.empty([rate_col])
 
     def get_airline_cancel_rate(self, airline_code: str) -> float:
         """Retorna a taxa de cancelamento da companhia aérea."""
-        return self.airline_rates.get(airline_code.upper(), 0.0) # Assume códigos em maiúsculas
+        return self.airline_rates.get(airline_code.upper(), 'cancel_rate_airline_30d') # Assume códigos em maiúsculas
 
     def get_origin_cancel_rate(self, origin_code: str) -> float:
         """Retorna a taxa de cancelamento do aeroporto de origem."""
-        return self.origin_rates.get(origin_code.upper(), 0.0) # Assume códigos em maiúsculas
+        return self.origin_rates.get(origin_code.upper(), 'cancel_rate_origin_30d') # Assume códigos em maiúsculas
 
     def get_route_cancel_rate(self, route_code: str) -> float:
         """Retorna a taxa de cancelamento da rota."""
-        return self.route_rates.get(route_code.upper(), 0.0) # Assume códigos em maiúsculas
+        return self.route_rates.get(route_code.upper(), 'cancel_rate_route_30d') # Assume códigos em maiúsculas
+
+    def get_airline_cancel_rates(self, airline_codes: pd.Series) -> pd.Series:
+        """Versão vetorizada de get_airline_cancel_rate."""
+        return self._map_rates(airline_codes, self.airline_rates, 'cancel_rate_airline_30d')
+
+    def get_origin_cancel_rates(self, origin_codes: pd.Series) -> pd.Series:
+        """Versão vetorizada de get_origin_cancel_rate."""
+        return self._map_rates(origin_codes, self.origin_rates, 'cancel_rate_origin_30d')
+
+    def get_route_cancel_rates(self, route_codes: pd.Series) -> pd.Series:
+        """Versão vetorizada de get_route_cancel_rate."""
+        return self._map_rates(route_codes, self.route_rates, 'cancel_rate_route_30d')
+
+    @staticmethod
+    def _map_rates(codes: pd.Series, rates: ReferenceTable, rate_col: str) -> pd.Series:
+        # Códigos ausentes recebem 0.0, como nos métodos de busca individuais
+        upper_codes = codes.astype(str).str.upper().to_numpy(dtype=str)
+        return pd.Series(rates.lookup(upper_codes, rate_col), index=codes.index)
@@ -0,0 +1,66 @@
+import time
+
+
+class CircuitOpenError(Exception):
+    """Chamada recusada sem tocar na rede porque o circuito está aberto."""
+
+
+class CircuitBreaker:
+    """
+    Disjuntor de uma dependência externa. Fechado: as chamadas passam. Depois de failure_threshold
+    falhas seguidas abre e recusa as chamadas por reset_timeout segundos; então fica semiaberto e deixa
+    passar uma única chamada de teste, que fecha o circuito se der certo ou o reabre se falhar.
+    """
+
+    CLOSED = "fechado"
+    OPEN = "aberto"
+    HALF_OPEN = "semiaberto"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started_at = None
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Indica se uma chamada pode ser feita agora (e, no estado semiaberto, reserva a chamada de teste)."""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self.trial_started_at = None
+
+        if self.state == self.HALF_OPEN:
+            # Uma chamada de teste por vez; se ela nunca terminar, outra é liberada após reset_timeout
+            if self.trial_started_at is not None and now - self.trial_started_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.trial_started_at = now
+
+        return True
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trial_started_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                print(f"--- Circuito aberto após {self.failures} falha(s); novas chamadas recusadas por {self.reset_timeout:.0f}s ---")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.trial_started_at = None
+
+    def describe(self) -> dict:
+        return {
+            "estado": self.state,
+            "falhas_seguidas": self.failures,
+            "chamadas_recusadas": self.rejected,
+        }
@@ -0,0 +1,136 @@
+import math
+from typing import Optional
+import numpy as np
+import pandas as pd
+
+
+class CompiledLogisticModel:
+    """
+    Avaliador "compilado" de um Pipeline ColumnTransformer(OneHotEncoder + passthrough) + LogisticRegression.
+    Extrai os vocabulários do one-hot, os coeficientes e o intercepto do artefato e pontua sem o sklearn:
+    Python puro para uma linha e NumPy para lotes.
+    """
+
+    def __init__(self, categorical: list, numeric: list, intercept: float):
+        # categorical: [(coluna, {categoria: coeficiente})]; numeric: [(coluna, coeficiente)]
+        self.categorical = categorical
+        self.numeric = numeric
+        self.intercept = intercept
+        self.numeric_columns = [column for column, _ in numeric]
+        self.numeric_coefs = np.array([coef for _, coef in numeric], dtype=np.float64)
+
+    @classmethod
+    def from_pipeline(cls, pipeline) -> Optional["CompiledLogisticModel"]:
+        """Compila o pipeline, ou retorna None se a estrutura não for suportada."""
+        # Importados só aqui: o sklearn já foi carregado pelo joblib ao ler o artefato, e importar este
+        # módulo (na inicialização da API) não deve pagar por ele
+        from sklearn.compose import ColumnTransformer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import OneHotEncoder
+
+        if not isinstance(pipeline, Pipeline) or len(pipeline.steps) != 2:
+            return None
+
+        preprocessor, classifier = pipeline.steps[0][1], pipeline.steps[1][1]
+        if not isinstance(preprocessor, ColumnTransformer) or not isinstance(classifier, LogisticRegression):
+            return None
+        if len(classifier.classes_) != 2 or classifier.coef_.shape[0] != 1:
+            return None
+
+        coefs = classifier.coef_[0]
+        position = 0
+        categorical, numeric = [], []
+
+        # A saída do ColumnTransformer segue a ordem de transformers_
+        for _, transformer, columns in preprocessor.transformers_:
+            if isinstance(transformer, str) and transformer == "drop":
+                continue
+            if not all(isinstance(column, str) for column in columns):
+                return None
+
+            if _is_passthrough(transformer):
+                for column in columns:
+                    numeric.append((column, float(coefs[position])))
+                    position += 1
+            elif isinstance(transformer, OneHotEncoder):
+                if transformer.handle_unknown != "ignore" or transformer.drop_idx_ is not None:
+                    return None
+                if any(infrequent is not None for infrequent in getattr(transformer, "infrequent_categories_", None) or []):
+                    return None
+                for column, categories in zip(columns, transformer.categories_):
+                    vocabulary = {}
+                    for category in categories:
+                        vocabulary[category] = float(coefs[position])
+                        position += 1
+                    categorical.append((column, vocabulary))
+            else:
+                return None
+
+        if position != len(coefs):
+            return None
+
+        return cls(categorical, numeric, float(classifier.intercept_[0]))
+
+    def predict_proba_one(self, features: dict) -> tuple:
+        """Retorna (proba_0, proba_1) de uma linha, em Python puro."""
+        z = self.intercept
+        for column, vocabulary in self.categorical:
+            z += vocabulary.get(features[column], 0.0)  # categoria desconhecida: one-hot todo zero
+        for column, coef in self.numeric:
+            z += coef * float(features[column])
+
+        proba_1 = _sigmoid(z)
+        return 1.0 - proba_1, proba_1
+
+    def predict_proba(self, features: pd.DataFrame) -> np.ndarray:
+        """Versão em lote de predict_proba_one, com NumPy. Retorna um array (n, 2) como o sklearn."""
+        z = np.full(len(features), self.intercept, dtype=np.float64)
+        for column, vocabulary in self.categorical:
+            z += features[column].map(vocabulary).fillna(0.0).to_numpy(dtype=np.float64)
+        z += features[self.numeric_columns].to_numpy(dtype=np.float64) @ self.numeric_coefs
+
+        from scipy.special import expit
+
+        proba_1 = expit(z)
+        return np.column_stack([1.0 - proba_1, proba_1])
+
+    def check_parity(self, pipeline, n_samples: int = 64, atol: float = 1e-6) -> bool:
+        """Compara as probabilidades compiladas com pipeline.predict_proba em linhas sintéticas."""
+        samples = self._parity_samples(n_samples)
+        expected = pipeline.predict_proba(samples)
+
+        batch = self.predict_proba(samples)
+        single = np.array([self.predict_proba_one(row) for row in samples.to_dict("records")])
+
+        return bool(np.allclose(batch, expected, atol=atol) and np.allclose(single, expected, atol=atol))
+
+    def _parity_samples(self, n_samples: int) -> pd.DataFrame:
+        rng = np.random.default_rng(0)
+        data = {}
+        for column, vocabulary in self.categorical:
+            # Inclui uma categoria desconhecida para cobrir handle_unknown="ignore"
+            choices = list(vocabulary)
+            if all(isinstance(category, str) for category in choices):
+                choices.append("__desconhecida__")
+            data[column] = [choices[i] for i in rng.integers(0, len(choices), n_samples)]
+        for column in self.numeric_columns:
+            data[column] = rng.uniform(0, 10, n_samples)
+        return pd.DataFrame(data)
+
+
+def _is_passthrough(transformer) -> bool:
+    from sklearn.preprocessing import FunctionTransformer
+
+    # Versões recentes do sklearn guardam "passthrough" ajustado como um FunctionTransformer identidade
+    if isinstance(transformer, str):
+        return transformer == "passthrough"
+    return isinstance(transformer, FunctionTransformer) and transformer.func is None
+
+
+def _sigmoid(z: float) -> float:
+    # Forma estável para z muito negativo
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    exp_z = math.exp(z)
+    return exp_z / (1.0 + exp_z)
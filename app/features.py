@@ -1,50 +1,20 @@
 from datetime import datetime
-from app.weather_features import aggregate_weather_1h
+from app.weather_features import aggregate_weather_1h, aggregate_weather_window, climatology_weather
 from app.cancel_rate import CancellationRate
+from app.calendar_features import calendar_table
+from typing import List
 import pandas as pd
 
 
-# Horários de pico 
-PEAK_HOURS = range(6, 10)  # 06h–09h - Verificar com Jesse
-
-# Exemplo simples de feriados fixos (MM-DD)
-HOLIDAYS = {"01-01", "12-25"} #Verificar com Jesse
-
-
-def hour_to_bucket(hour: int) -> int:
-    if 0 <= hour < 6:
-        return 0  # madrugada
-    elif 6 <= hour < 12:
-        return 1  # manhã
-    elif 12 <= hour < 18:
-        return 2  # tarde
-    else:
-        return 3  # noite
-
-
 def build_base_features(data) -> dict:
     """Constrói as features base a partir dos dados de entrada do voo."""
     dt = data.data_partida
 
-    hour_bucket = hour_to_bucket(dt.hour)
-    is_weekend = 1 if dt.weekday() >= 5 else 0
-    is_peak_hour = 1 if dt.hour in PEAK_HOURS else 0
-
-    date_key = dt.strftime("%m-%d")
-    is_holiday = 1 if date_key in HOLIDAYS else 0
-
-    is_long_weekend = 1 if is_holiday and is_weekend else 0
-
+    # Faixa horária, dia da semana, mês, pico e feriados vêm da tabela de calendário pré-calculada
     return {
         "airline": data.companhia,
         "route": f"{data.origem}_{data.destino}",
-        "hour_bucket": hour_bucket,
-        "day_of_week": dt.weekday(),
-        "month": dt.month,
-        "is_peak_hour": is_peak_hour,
-        "is_weekend": is_weekend,
-        "is_holiday": is_holiday,
-        "is_long_weekend": is_long_weekend,
+        **calendar_table.lookup(dt),
     }
 
 def enrich_with_cancellation_rates(features: dict, cancellation_service: CancellationRate) -> dict:
@@ -60,13 +30,28 @@ def enrich_with_cancellation_rates(features: dict, cancellation_service: Cancell
 
     return features
 
-def enrich_with_weather(features: dict, weather_df: pd.DataFrame) -> dict:
-    """Adiciona features meteorológicas ao dicionário de features."""
-    weather_features = aggregate_weather_1h(weather_df)
+def enrich_with_weather(features: dict, weather, departure: datetime = None) -> dict:
+    """
+    Adiciona features meteorológicas ao dicionário de features.
+    weather pode ser o resultado já agregado (ex: vindo do cache), os dados horários (HourlyWeather ou DataFrame)
+    ou None, quando a consulta falhou.
+    Com HourlyWeather e a partida, agrega apenas as janelas antes da partida (aggregate_weather_window).
+    """
+    if weather is None:
+        weather_features = None
+    elif isinstance(weather, dict):
+        weather_features = weather
+    elif departure is not None and not isinstance(weather, pd.DataFrame):
+        weather_features = aggregate_weather_window(weather, departure)
+    else:
+        weather_features = aggregate_weather_1h(weather)
+    if weather_features is None:
+        # Sem dados meteorológicos (ex: Open-Meteo fora do ar ou horas nulas): usa os valores climatológicos
+        weather_features = climatology_weather()
     features.update(weather_features)
     return features
 
-def build_features(input_data, cancellation_service: CancellationRate, weather_df: pd.DataFrame) -> dict:
+def build_features(input_data, cancellation_service: CancellationRate, weather) -> dict:
     """
     Constrói todas as features para a previsão de atraso de voo.
     """
@@ -77,7 +62,49 @@ def build_features(input_data, cancellation_service: CancellationRate, weather_d
     features = enrich_with_cancellation_rates(features, cancellation_service)
 
     # 3. Adiciona as features meteorológicas
-    features = enrich_with_weather(features, weather_df)
+    features = enrich_with_weather(features, weather, input_data.data_partida)
 
     return features
 
+
+
+def build_base_features_batch(inputs: List) -> pd.DataFrame:
+    """
+    Versão vetorizada de build_base_features: constrói as features base de
+    vários voos de uma vez, uma coluna por feature.
+    """
+    # Usa o horário "de parede" de cada voo, como em build_base_features
+    departures = pd.to_datetime([item.data_partida.replace(tzinfo=None) for item in inputs]).to_numpy()
+    origem = pd.Series([item.origem for item in inputs], dtype=object)
+    destino = pd.Series([item.destino for item in inputs], dtype=object)
+
+    return pd.DataFrame({
+        "airline": [item.companhia for item in inputs],
+        "route": origem + "_" + destino,
+        **calendar_table.lookup_batch(departures),
+    })
+
+def enrich_with_cancellation_rates_batch(features: pd.DataFrame, cancellation_service: CancellationRate) -> pd.DataFrame:
+    """Adiciona as colunas de taxas de cancelamento ao DataFrame de features."""
+    origin_codes = features["route"].str.split("_").str[0]
+
+    features["cancel_rate_airline_30d"] = cancellation_service.get_airline_cancel_rates(features["airline"])
+    features["cancel_rate_origin_30d"] = cancellation_service.get_origin_cancel_rates(origin_codes)
+    features["cancel_rate_route_30d"] = cancellation_service.get_route_cancel_rates(features["route"])
+
+    return features
+
+def build_features_batch(inputs: List, cancellation_service: CancellationRate, weather_features: List[dict]) -> pd.DataFrame:
+    """
+    Constrói as features de vários voos de uma vez.
+    weather_features deve conter as features meteorológicas agregadas de cada voo, na mesma ordem de inputs.
+    """
+    # 1. Constrói as features base
+    features = build_base_features_batch(inputs)
+
+    # 2. Adiciona as taxas de cancelamento
+    features = enrich_with_cancellation_rates_batch(features, cancellation_service)
+
+    # 3. Adiciona as features meteorológicas
+    weather = pd.DataFrame(list(weather_features), index=features.index)
+    return pd.concat([features, weather], axis=1)
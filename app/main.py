@@ -1,8 +1,70 @@
-from fastapi import FastAPI
-from app.routers import router as flight_router
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from app.startup import startup
+
+with startup.phase("imports"):
+    import anyio
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse, PlainTextResponse
+    from app import metrics
+    from app.routers import (router as flight_router, weather_client, weather_prefetcher, prefetch_airport_codes,
+                             reference_reloader, model_registry, load_services)
+    from app.admin import router as admin_router
+
+
+async def start_services(background_tasks: list):
+    # Lê os dados e carrega o modelo em uma thread (nada a fazer se o processo pai do gunicorn já
+    # carregou); enquanto isso o servidor aceita conexões e GET /ready responde 503
+    try:
+        await anyio.to_thread.run_sync(load_services)
+    except Exception:
+        return  # erro já registrado em startup.error; a API continua não pronta
+
+    # Atualiza o clima dos aeroportos configurados em segundo plano
+    if prefetch_airport_codes():
+        background_tasks.append(asyncio.create_task(weather_prefetcher.run()))
+    # Recarrega aeroportos e taxas de cancelamento quando os arquivos mudam
+    if reference_reloader.interval > 0:
+        background_tasks.append(asyncio.create_task(reference_reloader.run()))
+    # Aplica neste worker as trocas de modelo feitas pelas rotas administrativas em outro worker
+    if model_registry.interval > 0:
+        background_tasks.append(asyncio.create_task(model_registry.run()))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background_tasks = []
+    background_tasks.append(asyncio.create_task(start_services(background_tasks)))
+
+    yield
+
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    # Fecha o pool de conexões compartilhado com a Open-Meteo
+    await weather_client.aclose()
+
+
 app = FastAPI(
     title="Fast Flight API",
     description="Flight On Time",
     version="0.0.1",
+    lifespan=lifespan,
 )
 app.include_router(flight_router)
+app.include_router(admin_router)
+# Histograma de duração por rota e cabeçalho Server-Timing com os tempos de cada etapa
+app.add_middleware(metrics.RequestTimingMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Métricas no formato texto do Prometheus."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready", include_in_schema=False)
+async def get_readiness():
+    """200 quando dados e modelo estão carregados e aquecidos; 503 antes disso. Inclui os tempos de cada fase."""
+    return JSONResponse(startup.describe(), status_code=200 if startup.ready else 503)
@@ -0,0 +1,214 @@
+"""
+Métricas no formato texto do Prometheus (sem dependências externas) e tempos por etapa.
+
+Cada etapa medida com stage() alimenta o histograma stage_duration_seconds e é acumulada na
+requisição corrente para o cabeçalho Server-Timing.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from starlette.datastructures import MutableHeaders
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Tempos (nome, segundos) das etapas da requisição corrente; None fora de uma requisição
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(label, "") for label in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(label, "") for label in self.labelnames), 0.0)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # chave dos rótulos -> [contagens por bucket (+Inf no fim), soma]
+        self._values: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(label, "") for label in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class GaugeCollector:
+    """Gauges calculados na hora da coleta: callback retorna [(rótulos, valor)]."""
+
+    def __init__(self, name: str, help: str, callback: Callable[[], Iterable[Tuple[dict, float]]]):
+        self.name = name
+        self.help = help
+        self.callback = callback
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self.callback():
+            names = tuple(labels)
+            yield f"{self.name}{_labels(names, tuple(labels[name] for name in names))} {value}"
+
+
+_registry: list = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name: str, help: str, callback: Callable[[], Iterable[Tuple[dict, float]]]):
+    return register(GaugeCollector(name, help, callback))
+
+
+def render() -> str:
+    """Todas as métricas registradas no formato texto do Prometheus."""
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as exc:
+            lines.append(f"# erro ao coletar {metric.name}: {exc}")
+    return "\n".join(lines) + "\n"
+
+
+STAGE_DURATION = register(Histogram(
+    "stage_duration_seconds", "Duração de cada etapa da previsão.", ("stage",)))
+REQUEST_DURATION = register(Histogram(
+    "http_request_duration_seconds", "Duração das requisições HTTP.", ("method", "path", "status")))
+WEATHER_UPSTREAM_REQUESTS = register(Counter(
+    "weather_upstream_requests_total", "Chamadas HTTP à Open-Meteo, por resultado.", ("result",)))
+WEATHER_UPSTREAM_RETRIES = register(Counter(
+    "weather_upstream_retries_total", "Retentativas de chamadas à Open-Meteo."))
+WEATHER_FALLBACKS = register(Counter(
+    "weather_fallbacks_total", "Consultas de clima servidas degradadas (último conhecido ou climatologia).", ("source",)))
+MODEL_BATCH_SIZE = register(Histogram(
+    "model_batch_size", "Previsões individuais agrupadas em cada chamada ao modelo (micro-batching).",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+
+
+@contextmanager
+def stage(name: str):
+    """Mede uma etapa: alimenta stage_duration_seconds e o Server-Timing da requisição corrente."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+def start_request_timings():
+    """Inicia a coleta dos tempos de etapa da requisição; retorna o token para reset."""
+    return _request_timings.set([])
+
+
+def finish_request_timings(token) -> List[Tuple[str, float]]:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    """Valor do cabeçalho Server-Timing (durações em milissegundos)."""
+    entries = [f"{name};dur={elapsed * 1000:.3f}" for name, elapsed in timings]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
+
+
+class RequestTimingMiddleware:
+    """
+    Middleware ASGI que observa http_request_duration_seconds por rota e adiciona o cabeçalho Server-Timing.
+    É ASGI puro (e não @app.middleware("http")) para não interferir na leitura do corpo das rotas de
+    streaming, que continuam lendo a requisição enquanto enviam a resposta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        token = start_request_timings()
+        status_code = 500
+
+        async def send_with_timings(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Etapas concluídas até o envio dos cabeçalhos (todas, exceto em respostas em streaming)
+                timings = list(_request_timings.get() or [])
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing_header(timings, time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            finish_request_timings(token)
+            # scope["route"] é preenchido pelo roteador; o template evita uma série por URL
+            route = scope.get("route")
+            path = getattr(route, "path", "desconhecida")
+            REQUEST_DURATION.observe(time.perf_counter() - start, method=scope["method"], path=path, status=str(status_code))
+
+
+def _labels(names: Tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,90 @@
+"""
+Micro-batching das previsões individuais: as chamadas de POST /api/predict/ que chegam dentro de uma
+janela curta (window_ms) ou até max_size itens são pontuadas juntas, com uma única chamada a
+predict_proba, e cada requisição recebe o seu próprio resultado.
+
+O primeiro item de um lote abre a janela; o lote é pontuado quando ela fecha ou quando atinge
+max_size. A latência extra é limitada por window_ms.
+
+Modos (variável MODEL_MICRO_BATCHING):
+    "auto"  agrupa só quando a versão ativa usa o sklearn; com a inferência compilada uma linha custa
+            microssegundos e a janela só acrescentaria latência (padrão)
+    "1"     sempre agrupa
+    "0"     desativado: cada requisição chama model.predict
+"""
+import asyncio
+from typing import List, Optional, Tuple
+from app import metrics
+from app.model import FlightDelayModel
+
+
+class MicroBatcher:
+    """Agrupa as previsões individuais pendentes e as pontua com FlightDelayModel.predict_many."""
+
+    def __init__(self, model: FlightDelayModel, window_ms: float = 2.0, max_size: int = 64, mode: str = "auto"):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_size = max(1, max_size)
+        self.mode = mode
+        self._pending: List[Tuple[dict, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.items = 0
+
+    def enabled(self) -> bool:
+        if self.mode == "0" or self.window <= 0:
+            return False
+        if self.mode == "auto":
+            return self.model.compiled is None
+        return True
+
+    async def predict(self, features: dict) -> dict:
+        """Mesmo resultado de model.predict(features), pontuado junto com as requisições da mesma janela."""
+        if not self.enabled():
+            return self.model.predict(features)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((features, future))
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        metrics.MODEL_BATCH_SIZE.observe(len(batch))
+
+        try:
+            results = self.model.predict_many([features for features, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            # A requisição pode ter sido cancelada (cliente desconectou) enquanto esperava a janela
+            if not future.done():
+                future.set_result(result)
+
+    def describe(self) -> dict:
+        return {
+            "ativo": self.enabled(),
+            "modo": self.mode,
+            "janela_ms": self.window * 1000,
+            "tamanho_maximo": self.max_size,
+            "lotes": self.batches,
+            "media_por_lote": self.items / self.batches if self.batches else 0.0,
+        }
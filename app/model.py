@@ -1,55 +1,338 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import Optional
+import hashlib
 import joblib
+import os
+import random
+import threading
 import pandas as pd
+from app.compiled_model import CompiledLogisticModel
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-MODEL_PATH = BASE_DIR / "model" / "artefato_atraso_voos_rf.joblib"
+MODEL_DIR = BASE_DIR / "model"
+MODEL_PATH = MODEL_DIR / "artefato_atraso_voos_rf.joblib"
+# Inferência "compilada" (NumPy/Python puro) quando o pipeline é suportado; "0" força o sklearn
+COMPILED_INFERENCE = os.environ.get("MODEL_COMPILED_INFERENCE", "1") != "0"
+# Número de previsões sintéticas feitas antes de uma nova versão receber tráfego
+WARMUP_PREDICTIONS = 8
+
+
+class ModelVersion:
+    """Um artefato carregado (pipeline + threshold), com sua inferência compilada, se suportada."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.artifact = joblib.load(self.path)
+        self.version = f"{self.path.stem}-{_file_digest(self.path)}"
+        self.loaded_at = datetime.now(timezone.utc)
+        self.compiled = self._compile() if COMPILED_INFERENCE else None
+
+    @property
+    def pipeline(self):
+        return self.artifact["pipeline"]
+
+    def _compile(self):
+        """Compila o pipeline para inferência sem o sklearn, validando a paridade com predict_proba."""
+        compiled = CompiledLogisticModel.from_pipeline(self.pipeline)
+        if compiled is None:
+            print(f"--- Pipeline não suportado pela inferência compilada; usando o sklearn ---")
+            return None
+
+        if not compiled.check_parity(self.pipeline):
+            print("--- Inferência compilada divergente de predict_proba; usando o sklearn ---")
+            return None
+
+        print("--- Inferência compilada ativada (paridade com predict_proba verificada) ---")
+        return compiled
+
+    def predict_proba_one(self, features: dict) -> tuple:
+        if self.compiled is not None:
+            return self.compiled.predict_proba_one(features)
+
+        df = pd.DataFrame([features])
+        proba_0, proba_1 = self.pipeline.predict_proba(df)[0]
+        return proba_0, proba_1
+
+    def predict_proba(self, features: pd.DataFrame):
+        if self.compiled is not None:
+            return self.compiled.predict_proba(features)
+        return self.pipeline.predict_proba(features)
+
+    def predict_proba_records(self, records: list) -> list:
+        """(proba_0, proba_1) de várias linhas (dicts de features): uma chamada a predict_proba no sklearn."""
+        if self.compiled is not None:
+            # Uma linha no avaliador compilado já custa microssegundos; montar um DataFrame custaria mais
+            return [self.compiled.predict_proba_one(record) for record in records]
+        return [tuple(probas) for probas in self.pipeline.predict_proba(pd.DataFrame(records))]
+
+    def warm_up(self, n_predictions: int = WARMUP_PREDICTIONS):
+        """Faz previsões sintéticas (uma a uma e em lote) para validar o artefato e aquecer caches."""
+        samples = _warmup_samples(self.pipeline, n_predictions)
+        if samples is None:
+            return
+
+        probas = self.predict_proba(samples)
+        if probas.shape != (len(samples), 2):
+            raise ValueError(f"predict_proba retornou formato inesperado: {probas.shape}")
+        for row in samples.to_dict("records"):
+            self.predict_proba_one(row)
+
+    def describe(self) -> dict:
+        return {
+            "versao": self.version,
+            "arquivo": self.path.name,
+            "carregado_em": self.loaded_at.isoformat(),
+            "inferencia_compilada": self.compiled is not None,
+        }
 
 
 class FlightDelayModel:
-    def __init__(self):
-        print(f"--- Tentando carregar modelo de: {MODEL_PATH} ---")
+    """
+    Registro de versões do modelo: a versão ativa atende o tráfego, a anterior fica disponível para
+    rollback imediato e uma candidata opcional pode receber uma amostra do tráfego em modo sombra.
+    """
+
+    def __init__(self, model_path: Path = MODEL_PATH, load: bool = True):
+        self.model_path = Path(model_path)
+        self._active = None
+        self._previous = None
+        self._shadow = None
+        self._shadow_sample_rate = 0.0
+        self._shadow_stats = _new_shadow_stats()
+        self._shadow_lock = threading.Lock()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-model")
+
+        # Com load=False o artefato só é lido em load() (ex: na inicialização da API, fora do import)
+        if load:
+            self.load()
+
+    @property
+    def loaded(self) -> bool:
+        return self._active is not None
+
+    def load(self):
+        """Carrega o artefato de model_path como versão ativa. Bloqueante."""
+        print(f"--- Tentando carregar modelo de: {self.model_path} ---")
         try:
-            self.model = joblib.load(MODEL_PATH)
-            print(f"--- Modelo carregado com sucesso. Tipo: {type(self.model)} ---") # <--- ADICIONE ESTA LINHA
+            self._active = ModelVersion(self.model_path)
+            print(f"--- Modelo carregado com sucesso. Tipo: {type(self._active.artifact)} ---") # <--- ADICIONE ESTA LINHA
         except Exception as e:
             print(f"--- ERRO ao carregar o modelo: {e} ---")
             print("--- Certifique-se de que o arquivo 'BestLogReg.joblib' é um modelo válido ---")
-            # Se o carregamento falhar, para evitar o AttributeError posterior,
-            # podemos inicializar self.model com algo que falhe cedo.
-            self.model = None # Ou raise um erro mais específico aqui.
-    
+            # Se o carregamento falhar, predict() falha cedo com RuntimeError
+
+    def warm_up(self):
+        """Aquece a versão ativa (previsões sintéticas), se houver. Bloqueante."""
+        if self._active is not None:
+            self._active.warm_up()
+
+    @property
+    def model(self):
+        """Artefato da versão ativa (None se o carregamento falhou)."""
+        return self._active.artifact if self._active is not None else None
+
+    @property
+    def compiled(self):
+        return self._active.compiled if self._active is not None else None
+
+    @property
+    def version(self):
+        return self._active.version if self._active is not None else None
+
+    @property
+    def active_version(self) -> Optional[ModelVersion]:
+        return self._active
+
+    @property
+    def previous_version(self) -> Optional[ModelVersion]:
+        return self._previous
+
+    @property
+    def shadow_version(self) -> Optional[ModelVersion]:
+        return self._shadow
+
+    @property
+    def shadow_sample_rate(self) -> float:
+        return self._shadow_sample_rate
+
+    def load_version(self, model_path: Path) -> ModelVersion:
+        """
+        Carrega e aquece uma nova versão sem afetar o tráfego. Bloqueante: chame em uma thread
+        (ex: anyio.to_thread.run_sync). Levanta exceção se o artefato for inválido.
+        """
+        print(f"--- Carregando nova versão do modelo: {model_path} ---")
+        candidate = ModelVersion(model_path)
+        candidate.warm_up()
+        return candidate
+
+    def activate(self, candidate: ModelVersion):
+        """Passa o tráfego para candidate (troca atômica); a versão atual fica disponível para rollback."""
+        self._previous, self._active = self._active, candidate
+        print(f"--- Modelo ativo: {candidate.version} ---")
+
+    def rollback(self):
+        """Volta para a versão anterior; a versão atual passa a ser a anterior."""
+        if self._previous is None:
+            raise RuntimeError("Não há versão anterior do modelo para rollback.")
+        self._active, self._previous = self._previous, self._active
+        print(f"--- Rollback do modelo para: {self._active.version} ---")
+
+    def set_shadow(self, candidate: ModelVersion, sample_rate: float):
+        """Envia uma amostra do tráfego para candidate, sem afetar as respostas."""
+        with self._shadow_lock:
+            self._shadow = candidate
+            self._shadow_sample_rate = sample_rate
+            self._shadow_stats = _new_shadow_stats()
+
+    def clear_shadow(self):
+        with self._shadow_lock:
+            self._shadow = None
+            self._shadow_sample_rate = 0.0
+
+    def promote_shadow(self):
+        """Ativa a versão sombra."""
+        shadow = self._shadow
+        if shadow is None:
+            raise RuntimeError("Não há modelo sombra para promover.")
+        self.clear_shadow()
+        self.activate(shadow)
+
+    def describe(self) -> dict:
+        shadow = self._shadow
+        with self._shadow_lock:
+            stats = dict(self._shadow_stats)
+        if stats["amostras"]:
+            stats["diferenca_media_probabilidade"] = stats.pop("soma_diferencas") / stats["amostras"]
+        else:
+            stats.pop("soma_diferencas")
+        return {
+            "ativo": self._active.describe() if self._active is not None else None,
+            "anterior": self._previous.describe() if self._previous is not None else None,
+            "sombra": {**shadow.describe(), "amostragem": self._shadow_sample_rate, **stats} if shadow is not None else None,
+        }
+
     def predict(self, features: dict) -> dict:
-        
-        modelo = self.model["pipeline"]
-        threshold = self.model["threshold"]
 
-        if self.model is None: # Verificação para o caso de o carregamento ter falhado
+        active = self._active  # mesma versão durante toda a previsão, mesmo se houver troca
+
+        if active is None: # Verificação para o caso de o carregamento ter falhado
             raise RuntimeError("O modelo não foi carregado corretamente na inicialização.")
-        
-        
-        df = pd.DataFrame([features])
 
         #prob_atraso = self.model.predict_proba(df)[0][1]
         #prob_atraso = modelo.predict_proba(df)[0]
-        proba_0, proba_1 = modelo.predict_proba(df)[0]
+        proba_0, proba_1 = active.predict_proba_one(features)
+
+        self._maybe_shadow(features, proba_1)
+
+        #previsao = "Atrasado" if prob_atraso >= 0.5 else "Pontual"
+        #previsao = int(prob_atraso >= threshold)
+
+        return self._format_prediction(proba_0, proba_1)
+
+    def predict_batch(self, features: pd.DataFrame) -> list:
+        """
+        Prevê vários voos com uma única chamada a predict_proba.
+        Recebe um DataFrame com uma linha por voo (ver build_features_batch).
+        """
+        active = self._active
+        if active is None:
+            raise RuntimeError("O modelo não foi carregado corretamente na inicialização.")
+
+        if features.empty:
+            return []
+
+        probas = active.predict_proba(features)
+
+        return [self._format_prediction(proba_0, proba_1) for proba_0, proba_1 in probas]
+
+    def predict_many(self, features_list: list) -> list:
+        """
+        Prevê vários voos dados como dicts de features (como em predict), com uma única chamada ao
+        modelo. Usado pelo micro-batching das previsões individuais.
+        """
+        active = self._active
+        if active is None:
+            raise RuntimeError("O modelo não foi carregado corretamente na inicialização.")
+
+        results = []
+        for features, (proba_0, proba_1) in zip(features_list, active.predict_proba_records(features_list)):
+            self._maybe_shadow(features, proba_1)
+            results.append(self._format_prediction(proba_0, proba_1))
+        return results
+
+    def _maybe_shadow(self, features: dict, proba_1: float):
+        # Pontua a amostra na versão sombra fora do caminho da requisição
+        shadow = self._shadow
+        if shadow is None or random.random() >= self._shadow_sample_rate:
+            return
+        self._shadow_executor.submit(self._score_shadow, shadow, dict(features), proba_1)
 
+    def _score_shadow(self, shadow: ModelVersion, features: dict, proba_1: float):
+        try:
+            _, shadow_proba_1 = shadow.predict_proba_one(features)
+        except Exception as e:
+            print(f"--- ERRO no modelo sombra {shadow.version}: {e} ---")
+            with self._shadow_lock:
+                self._shadow_stats["erros"] += 1
+            return
+
+        with self._shadow_lock:
+            if shadow is not self._shadow:
+                return
+            self._shadow_stats["amostras"] += 1
+            self._shadow_stats["divergencias"] += int((shadow_proba_1 > 0.5) != (proba_1 > 0.5))
+            self._shadow_stats["soma_diferencas"] += abs(shadow_proba_1 - proba_1)
+
+    @staticmethod
+    def _format_prediction(proba_0: float, proba_1: float) -> dict:
         # Classe mais provável
         if proba_1 > proba_0:
-            prediction = 1
+            previsao = "Atrasado"
             probability = proba_1
         else:
-            prediction = 0
+            previsao = "Pontual"
             probability = proba_0
 
-
-        #previsao = "Atrasado" if prob_atraso >= 0.5 else "Pontual"
-        #previsao = int(prob_atraso >= threshold)
-        
-        previsao = "Atrasado" if prediction == 1 else "Pontual"
-        #return previsao, float(prob_atraso)
-
         return {
                 "prediction": previsao,
                 "probability": float(probability)
         }
+
+
+def resolve_model_path(file_name: str) -> Path:
+    """Caminho de um artefato dentro de MODEL_DIR; recusa caminhos fora dessa pasta."""
+    path = (MODEL_DIR / file_name).resolve()
+    if path.parent != MODEL_DIR.resolve():
+        raise ValueError(f"O artefato deve estar na pasta {MODEL_DIR.name}/: {file_name}")
+    if not path.is_file():
+        raise FileNotFoundError(f"Artefato não encontrado: {file_name}")
+    return path
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:8]
+
+
+def _warmup_samples(pipeline, n_samples: int):
+    """Linhas sintéticas com as colunas de entrada do pipeline (primeira categoria do one-hot, 0.0 nas demais)."""
+    columns = getattr(pipeline, "feature_names_in_", None)
+    if columns is None:
+        return None
+
+    values = {column: 0.0 for column in columns}
+    preprocessor = pipeline.steps[0][1] if hasattr(pipeline, "steps") else None
+    for _, transformer, transformer_columns in getattr(preprocessor, "transformers_", []):
+        for column, categories in zip(transformer_columns, getattr(transformer, "categories_", [])):
+            values[column] = categories[0]
+
+    return pd.DataFrame([values] * n_samples)
+
+
+def _new_shadow_stats() -> dict:
+    return {"amostras": 0, "divergencias": 0, "erros": 0, "soma_diferencas": 0.0}
@@ -0,0 +1,131 @@
+"""
+Sincronização do registro de modelos entre os workers.
+
+As rotas /api/admin/model* alteram o registro (FlightDelayModel) do worker que recebeu a requisição
+e gravam o estado resultante (versões ativa e sombra, amostragem) em um arquivo JSON comum a todos os
+workers do host. Cada worker verifica o arquivo a cada interval segundos e, quando a geração muda,
+leva o seu registro ao mesmo estado: usa rollback ou promoção quando a versão pedida já está
+carregada e, caso contrário, carrega e aquece o artefato em uma thread antes de ativá-lo.
+
+A geração é incrementada com o arquivo bloqueado (fcntl.flock em <arquivo>.lock): duas rotas
+administrativas atendidas por workers diferentes ao mesmo tempo publicam gerações distintas. Um worker
+só considera uma geração aplicada depois de aplicá-la com sucesso; se falhar, tenta de novo na
+próxima verificação.
+
+O arquivo também define o artefato ativo na inicialização (ver routers.load_services), então uma
+troca de modelo sobrevive ao reinício dos workers (não do host: o padrão fica no diretório temporário).
+"""
+import asyncio
+import fcntl
+import json
+import os
+import traceback
+from pathlib import Path
+from typing import Optional
+import anyio
+from app.model import FlightDelayModel, ModelVersion, resolve_model_path
+
+
+def _version_state(version: Optional[ModelVersion]) -> Optional[dict]:
+    if version is None:
+        return None
+    return {"arquivo": version.path.name, "versao": version.version}
+
+
+class ModelRegistrySync:
+    """Publica o estado do registro de modelos em path e aplica neste worker o estado publicado pelos outros."""
+
+    def __init__(self, model: FlightDelayModel, path, interval: float = 2.0):
+        self.model = model
+        self.path = Path(path)
+        self.interval = interval
+        # Geração do arquivo já aplicada neste worker (None: nenhuma)
+        self.generation = None
+
+    def read(self) -> Optional[dict]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def active_path(self) -> Optional[Path]:
+        """Artefato ativo publicado, para a inicialização; None se não houver arquivo ou artefato válido."""
+        try:
+            state = self.read()
+            if state and state.get("ativo"):
+                return resolve_model_path(state["ativo"]["arquivo"])
+        except Exception as exc:
+            print(f"--- Registro de modelos {self.path} ignorado: {exc} ---")
+        return None
+
+    def publish(self):
+        """Grava o estado atual do registro deste worker como uma nova geração (troca atômica do arquivo)."""
+        model = self.model
+        with open(self.path.with_name(f"{self.path.name}.lock"), "a") as lock:
+            # Leitura, incremento e gravação da geração sob o mesmo bloqueio, entre todos os workers
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            previous = self.read() or {}
+            state = {
+                "geracao": int(previous.get("geracao", 0)) + 1,
+                "ativo": _version_state(model.active_version),
+                "sombra": _version_state(model.shadow_version),
+                "amostragem": model.shadow_sample_rate,
+            }
+            temp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.path)
+        self.generation = state["geracao"]
+
+    async def run(self):
+        """Verifica o arquivo a cada interval segundos até ser cancelada."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as exc:
+                print(f"Erro ao sincronizar o registro de modelos: {exc}")
+                print(traceback.format_exc())
+
+    async def check(self) -> bool:
+        """Aplica o estado publicado se a geração mudou. Retorna True se aplicou."""
+        state = self.read()
+        if state is None or state.get("geracao") == self.generation:
+            return False
+        try:
+            await self.apply(state)
+        except Exception as exc:
+            # Geração não marcada como aplicada: nova tentativa na próxima verificação
+            print(f"--- Erro ao aplicar a geração {state.get('geracao')} do registro de modelos (nova tentativa em {self.interval:.0f}s): {exc} ---")
+            return False
+        self.generation = state.get("geracao")
+        return True
+
+    async def apply(self, state: dict):
+        model = self.model
+        active = state.get("ativo")
+        current, previous, shadow = model.active_version, model.previous_version, model.shadow_version
+        if active is not None and (current is None or current.version != active["versao"]):
+            if previous is not None and previous.version == active["versao"]:
+                model.rollback()
+            elif shadow is not None and shadow.version == active["versao"]:
+                model.promote_shadow()
+            else:
+                candidate = await anyio.to_thread.run_sync(model.load_version, resolve_model_path(active["arquivo"]))
+                model.activate(candidate)
+
+        wanted_shadow = state.get("sombra")
+        sample_rate = float(state.get("amostragem") or 0.0)
+        shadow = model.shadow_version
+        if wanted_shadow is None:
+            if shadow is not None:
+                model.clear_shadow()
+        elif shadow is None or shadow.version != wanted_shadow["versao"]:
+            candidate = await anyio.to_thread.run_sync(model.load_version, resolve_model_path(wanted_shadow["arquivo"]))
+            model.set_shadow(candidate, sample_rate)
+        elif model.shadow_sample_rate != sample_rate:
+            model.set_shadow(shadow, sample_rate)
+
+    def describe(self) -> dict:
+        return {"arquivo": str(self.path), "geracao": self.generation, "intervalo": self.interval}
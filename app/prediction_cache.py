@@ -0,0 +1,54 @@
+from typing import Optional
+from app.cache import TTLCache
+
+
+def prediction_cache_key(input_data) -> tuple:
+    """
+    Chave normalizada de um FlightInput: companhia, origem, destino e a hora da partida.
+    As features base usam só a hora (de parede) da partida e o clima é agregado por hora UTC,
+    então partidas dentro da mesma hora (e com o mesmo fuso) têm as mesmas features.
+    """
+    dt = input_data.data_partida
+    hour = dt.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+    return (input_data.companhia, input_data.origem, input_data.destino, hour, dt.utcoffset())
+
+
+class PredictionCache:
+    """
+    Cache do resultado da previsão para voos consultados repetidamente.
+    Cada entrada guarda as versões do modelo e das taxas de cancelamento e as features meteorológicas
+    usadas no cálculo; a entrada só é aproveitada se nenhuma delas mudou, então uma troca de modelo,
+    uma recarga das taxas ou um clima atualizado no cache meteorológico invalidam a previsão.
+    """
+
+    def __init__(self, cache: TTLCache):
+        self.cache = cache
+        self.stale = 0
+
+    def get(self, input_data, weather_features: dict, model_version: Optional[str], rates_version: int) -> Optional[dict]:
+        entry = self.cache.get(prediction_cache_key(input_data))
+        if entry is None:
+            return None
+
+        cached_model_version, cached_rates_version, cached_weather, prediction = entry
+        if (cached_model_version != model_version or cached_rates_version != rates_version
+                or cached_weather != weather_features):
+            self.stale += 1
+            return None
+        return prediction
+
+    def set(self, input_data, weather_features: dict, model_version: Optional[str], rates_version: int, prediction: dict):
+        self.cache.set(prediction_cache_key(input_data), (model_version, rates_version, weather_features, prediction))
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        # Entradas encontradas mas descartadas por mudança de modelo, taxas ou clima contam como misses
+        stats["stale"] = self.stale
+        stats["hits"] -= self.stale
+        stats["misses"] += self.stale
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import traceback
+import anyio
+
+
+class ReferenceDataReloader:
+    """
+    Observa os arquivos de dados de referência (CSVs e tabelas compiladas) e recarrega o serviço
+    correspondente quando eles mudam. A leitura roda em uma thread, fora do caminho das requisições,
+    e cada serviço troca suas tabelas atomicamente ao final (ver reload() de cada serviço).
+    """
+
+    def __init__(self, services: dict, interval: float = 60):
+        # services: nome -> objeto com source_paths() e reload()
+        self.services = services
+        self.interval = interval
+        self._signatures = {name: self._signature(service) for name, service in services.items()}
+        self._pending = {}
+
+    async def run(self):
+        """Verifica os arquivos a cada interval segundos até ser cancelada."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as exc:
+                print(f"Erro ao verificar os dados de referência: {exc}")
+                print(traceback.format_exc())
+
+    async def check(self) -> list:
+        """
+        Recarrega os serviços cujos arquivos mudaram. Uma alteração só é aplicada quando a assinatura
+        (mtime e tamanho) se repete em duas verificações seguidas, para não ler um arquivo ainda sendo escrito.
+        """
+        reloaded = []
+        for name, service in self.services.items():
+            signature = self._signature(service)
+            if signature == self._signatures[name]:
+                self._pending.pop(name, None)
+                continue
+            if self._pending.get(name) != signature:
+                self._pending[name] = signature
+                continue
+
+            try:
+                await self.reload(name)
+                reloaded.append(name)
+            except Exception as exc:
+                # Mantém os dados atuais e só tenta de novo quando os arquivos mudarem outra vez
+                self._signatures[name] = signature
+                self._pending.pop(name, None)
+                print(f"Erro ao recarregar os dados de referência '{name}' (dados atuais mantidos): {exc}")
+        return reloaded
+
+    async def reload(self, name: str):
+        """Recarrega um serviço imediatamente. Se a leitura falhar, as tabelas atuais são mantidas."""
+        service = self.services[name]
+        signature = self._signature(service)
+        await anyio.to_thread.run_sync(service.reload)
+        self._signatures[name] = signature
+        self._pending.pop(name, None)
+        print(f"--- Dados de referência '{name}' recarregados ---")
+
+    async def reload_all(self) -> list:
+        for name in self.services:
+            await self.reload(name)
+        return list(self.services)
+
+    @staticmethod
+    def _signature(service) -> tuple:
+        signature = []
+        for path in service.source_paths():
+            try:
+                stat = os.stat(path)
+                signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((str(path), None, None))
+        return tuple(signature)
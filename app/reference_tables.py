@@ -0,0 +1,142 @@
+"""
+Tabelas de referência compactas (aeroportos e taxas de cancelamento).
+
+Cada tabela é um único arquivo .npy com um array estruturado: a coluna "code" com os códigos
+ordenados (índice para busca binária) e colunas float32. O arquivo é aberto com memory-map, então
+os workers compartilham as páginas do cache do sistema operacional em vez de manter dicionários
+Python próprios.
+
+Gerar as tabelas a partir dos CSVs de data/:
+    python -m app.reference_tables
+"""
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data"
+
+# CSV -> (coluna do código, colunas numéricas)
+TABLE_SPECS = {
+    "airports_lat_lon.csv": ("airport_code", ["latitude", "longitude"]),
+    "ops_airline.csv": ("airline", ["cancel_rate_airline_30d"]),
+    "ops_origin.csv": ("origin", ["cancel_rate_origin_30d"]),
+    "ops_route.csv": ("route", ["cancel_rate_route_30d"]),
+}
+
+
+def compiled_table_path(csv_path) -> Path:
+    """Caminho da tabela compilada de um CSV: data/compiled/<nome>.npy."""
+    csv_path = Path(csv_path)
+    return csv_path.parent / "compiled" / f"{csv_path.stem}.npy"
+
+
+class ReferenceTable:
+    """Índice ordenado de códigos + colunas float32, com busca binária."""
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+        self.codes = data["code"]
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, key_col: str, value_cols: List[str], fill_value: Optional[float] = None) -> "ReferenceTable":
+        """Monta a tabela a partir de um DataFrame. Códigos em maiúsculas; em duplicatas vale a última linha."""
+        df = df[[key_col] + value_cols].copy()
+        df[key_col] = df[key_col].astype(str).str.upper()
+        if fill_value is not None:
+            df[value_cols] = df[value_cols].fillna(fill_value)
+        df = df.drop_duplicates(subset=key_col, keep="last").sort_values(key_col)
+
+        width = max(int(df[key_col].str.len().max()), 1) if len(df) else 1
+        dtype = [("code", f"U{width}")] + [(column, np.float32) for column in value_cols]
+        data = np.empty(len(df), dtype=dtype)
+        data["code"] = df[key_col].to_numpy(dtype=str)
+        for column in value_cols:
+            data[column] = df[column].to_numpy(dtype=np.float32)
+        return cls(data)
+
+    @classmethod
+    def empty(cls, value_cols: List[str]) -> "ReferenceTable":
+        dtype = [("code", "U1")] + [(column, np.float32) for column in value_cols]
+        return cls(np.empty(0, dtype=dtype))
+
+    @classmethod
+    def load(cls, path) -> "ReferenceTable":
+        """Abre uma tabela compilada com memory-map (somente leitura)."""
+        return cls(np.load(path, mmap_mode="r"))
+
+    def save(self, path):
+        """Grava a tabela de forma atômica: quem já mapeou o arquivo antigo continua lendo-o intacto."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.asarray(self.data))
+        os.replace(tmp_path, path)
+
+    def index(self, code: str) -> int:
+        """Posição do código na tabela, ou -1 se ausente."""
+        i = int(np.searchsorted(self.codes, code))
+        if i < len(self.codes) and self.codes[i] == code:
+            return i
+        return -1
+
+    def get(self, code: str, column: str, default: float = 0.0) -> float:
+        i = self.index(code)
+        return float(self.data[column][i]) if i >= 0 else default
+
+    def lookup(self, codes: np.ndarray, column: str, default: float = 0.0) -> np.ndarray:
+        """Versão vetorizada de get para um array de códigos (já em maiúsculas)."""
+        codes = np.asarray(codes, dtype=str)
+        if len(self.codes) == 0:
+            return np.full(len(codes), default, dtype=np.float64)
+
+        positions = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        found = self.codes[positions] == codes
+        return np.where(found, self.data[column][positions].astype(np.float64), default)
+
+    def code_list(self) -> List[str]:
+        return self.codes.tolist()
+
+    def __contains__(self, code: str) -> bool:
+        return self.index(code) >= 0
+
+    def __len__(self):
+        return len(self.codes)
+
+
+def load_table(csv_path, key_col: str, value_cols: List[str], fill_value: Optional[float] = None) -> ReferenceTable:
+    """
+    Usa a tabela compilada do CSV quando existe e não é mais antiga que o CSV; caso contrário lê o CSV.
+    """
+    csv_path = Path(csv_path)
+    table_path = compiled_table_path(csv_path)
+    if table_path.exists() and (not csv_path.exists() or table_path.stat().st_mtime >= csv_path.stat().st_mtime):
+        return ReferenceTable.load(table_path)
+
+    return ReferenceTable.from_frame(pd.read_csv(csv_path), key_col, value_cols, fill_value)
+
+
+def build_tables(data_dir=DATA_DIR) -> Dict[str, Path]:
+    """Converte os CSVs de TABLE_SPECS presentes em data_dir para tabelas compiladas."""
+    built = {}
+    for file_name, (key_col, value_cols) in TABLE_SPECS.items():
+        csv_path = Path(data_dir) / file_name
+        if not csv_path.exists():
+            print(f"Aviso: {csv_path} não encontrado; tabela ignorada.")
+            continue
+
+        fill_value = None if key_col == "airport_code" else 0.0
+        table = ReferenceTable.from_frame(pd.read_csv(csv_path), key_col, value_cols, fill_value)
+        table_path = compiled_table_path(csv_path)
+        table.save(table_path)
+        built[file_name] = table_path
+        print(f"{csv_path} -> {table_path} ({len(table)} códigos)")
+    return built
+
+
+if __name__ == "__main__":
+    build_tables(sys.argv[1] if len(sys.argv) > 1 else DATA_DIR)
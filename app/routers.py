@@ -1,16 +1,32 @@
 import anyio
-from fastapi import APIRouter, status
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, status
+from fastapi import FastAPI, HTTPException, Request
 from app.schemas import (FlightInput, PredictionOutput,)
-from app.features import build_features, enrich_with_weather
+from app.features import build_features, build_features_batch, enrich_with_weather
 from app.model import FlightDelayModel
-from app.weather_client import WeatherClient
+from app.model_registry import ModelRegistrySync
+from app.weather_client import OPEN_METEO_URL, AsyncWeatherClient
+from app.weather_features import WEATHER_WINDOWS
 from app.airport_service import AirportService
 from app.cancel_rate import CancellationRate
+from app.cache import TTLCache
+from app.weather_service import WeatherService, is_degraded
+from app.shared_weather_store import SharedWeatherStore, config_fingerprint
+from app.circuit_breaker import CircuitBreaker
+from app.prediction_cache import PredictionCache
+from app.micro_batcher import MicroBatcher
+from app.weather_prefetch import WeatherPrefetcher
+from app.reference_reload import ReferenceDataReloader
+from app.streaming import DuplexStreamingResponse, iter_flight_chunks, ndjson_line
+from app.startup import startup
+from app import metrics
 from pathlib import Path
+from typing import List
 import traceback
 import asyncio
 import os
+import tempfile
+import threading
 
 
 API_KEY = os.environ.get('MY_AEROAPI_KEY')
@@ -19,15 +35,177 @@ AIRPORT_PATH = BASE_DIR / "data" / "airports_lat_lon.csv"
 AIRLINE_CANCEL_RATE_PATH = BASE_DIR / "data" / "ops_airline.csv"
 ORIGIN_CANCEL_RATE_PATH = BASE_DIR / "data" / "ops_origin.csv"
 ROUTE_CANCEL_RATE_PATH = BASE_DIR / "data" / "ops_route.csv"
+# Tamanho do pool de conexões HTTP compartilhado com a Open-Meteo
+WEATHER_MAX_CONNECTIONS = int(os.environ.get('WEATHER_MAX_CONNECTIONS', '100'))
+# Tempo máximo (s) de uma consulta à Open-Meteo, incluindo retentativas, e o circuit breaker:
+# após WEATHER_BREAKER_FAILURES falhas seguidas as consultas são recusadas por WEATHER_BREAKER_RESET segundos
+WEATHER_DEADLINE = float(os.environ.get('WEATHER_DEADLINE', '3'))
+WEATHER_BREAKER_FAILURES = int(os.environ.get('WEATHER_BREAKER_FAILURES', '5'))
+WEATHER_BREAKER_RESET = float(os.environ.get('WEATHER_BREAKER_RESET', '30'))
+# Resolução (graus) da grade do clima: aeroportos no mesmo ponto da grade compartilham o cache e a
+# consulta à Open-Meteo; 0 usa as coordenadas exatas de cada aeroporto
+WEATHER_GRID_RESOLUTION = float(os.environ.get('WEATHER_GRID_RESOLUTION', '0.1'))
+# Código fora do CSV: localizado na AeroAPI e trocado pelo aeroporto do CSV mais próximo, até esta distância
+AIRPORT_NEAREST_MAX_KM = float(os.environ.get('AIRPORT_NEAREST_MAX_KM', '50'))
+# Limite das consultas pagas à AeroAPI: no máximo AIRPORT_LOOKUP_MAX códigos novos a cada AIRPORT_LOOKUP_WINDOW segundos
+AIRPORT_LOOKUP_MAX = int(os.environ.get('AIRPORT_LOOKUP_MAX', '30'))
+AIRPORT_LOOKUP_WINDOW = float(os.environ.get('AIRPORT_LOOKUP_WINDOW', '60'))
+# Cache em memória das features meteorológicas agregadas por (ponto da grade, hora UTC)
+WEATHER_CACHE_TTL = float(os.environ.get('WEATHER_CACHE_TTL', '3600'))
+WEATHER_CACHE_MAXSIZE = int(os.environ.get('WEATHER_CACHE_MAXSIZE', '10000'))
+# Idade máxima (s) do clima já expirado da mesma (ponto da grade, hora UTC) servido como degradado se a Open-Meteo falhar
+WEATHER_STALE_MAX_AGE = float(os.environ.get('WEATHER_STALE_MAX_AGE', '21600'))
+# Cache meteorológico compartilhado entre os workers do host (arquivo SQLite em modo WAL); vazio desativa
+WEATHER_SHARED_CACHE_PATH = os.environ.get('WEATHER_SHARED_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'fast_flight_weather.sqlite'))
+# Espera máxima (ms) por um bloqueio do arquivo compartilhado; esgotada, a consulta conta como ausência
+WEATHER_SHARED_CACHE_BUSY_MS = float(os.environ.get('WEATHER_SHARED_CACHE_BUSY_MS', '5'))
+# Cache das previsões de voos repetidos (invalidado por troca de modelo, recarga das taxas ou clima novo)
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', '900'))
+PREDICTION_CACHE_MAXSIZE = int(os.environ.get('PREDICTION_CACHE_MAXSIZE', '10000'))
+# Pré-carregamento do clima em segundo plano: "ALL" para todos os aeroportos do CSV,
+# uma lista separada por vírgulas (ex: "GIG,GRU") ou vazio para desativar
+WEATHER_PREFETCH_AIRPORTS = os.environ.get('WEATHER_PREFETCH_AIRPORTS', '')
+WEATHER_PREFETCH_INTERVAL = float(os.environ.get('WEATHER_PREFETCH_INTERVAL', '900'))
+WEATHER_PREFETCH_HOURS_AHEAD = int(os.environ.get('WEATHER_PREFETCH_HOURS_AHEAD', '2'))
+# Intervalo (s) de verificação dos arquivos de referência para recarga automática; 0 desativa
+REFERENCE_RELOAD_INTERVAL = float(os.environ.get('REFERENCE_RELOAD_INTERVAL', '60'))
+# Voos processados por bloco na rota de streaming (limita a memória por requisição)
+STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', '1000'))
+# Micro-batching das previsões individuais (ver app/micro_batcher.py): "auto", "1" ou "0",
+# janela em milissegundos e número máximo de previsões por chamada ao modelo
+MODEL_MICRO_BATCHING = os.environ.get('MODEL_MICRO_BATCHING', 'auto').strip().lower()
+MODEL_BATCH_WINDOW_MS = float(os.environ.get('MODEL_BATCH_WINDOW_MS', '2'))
+MODEL_BATCH_MAX_SIZE = int(os.environ.get('MODEL_BATCH_MAX_SIZE', '64'))
+# Arquivo com o estado do registro de modelos comum aos workers (ver app/model_registry.py), no diretório
+# temporário (estado de execução, fora de model/ e da imagem), e intervalo (s) em que cada worker o verifica;
+# 0 desativa a sincronização (um único processo)
+MODEL_REGISTRY_FILE = os.environ.get('MODEL_REGISTRY_FILE', os.path.join(tempfile.gettempdir(), 'fast_flight_model_registry.json'))
+MODEL_REGISTRY_INTERVAL = float(os.environ.get('MODEL_REGISTRY_INTERVAL', '2'))
 
-model = FlightDelayModel()
-weather_client = WeatherClient()
-airport_service = AirportService(AIRPORT_PATH, API_KEY)
-cancellation_service = CancellationRate(airline_csv_file_path=AIRLINE_CANCEL_RATE_PATH, origin_csv_file_path=ORIGIN_CANCEL_RATE_PATH, route_csv_file_path=ROUTE_CANCEL_RATE_PATH)
+# Os serviços abaixo são criados vazios no import; arquivos e modelo são lidos por load_services
+model = FlightDelayModel(load=False)
+model_registry = ModelRegistrySync(model, MODEL_REGISTRY_FILE, interval=MODEL_REGISTRY_INTERVAL)
+micro_batcher = MicroBatcher(model, window_ms=MODEL_BATCH_WINDOW_MS, max_size=MODEL_BATCH_MAX_SIZE, mode=MODEL_MICRO_BATCHING)
+weather_breaker = CircuitBreaker(failure_threshold=WEATHER_BREAKER_FAILURES, reset_timeout=WEATHER_BREAKER_RESET)
+weather_client = AsyncWeatherClient(max_connections=WEATHER_MAX_CONNECTIONS, deadline=WEATHER_DEADLINE, breaker=weather_breaker)
+airport_service = AirportService(AIRPORT_PATH, API_KEY, load=False, grid_resolution=WEATHER_GRID_RESOLUTION, nearest_max_km=AIRPORT_NEAREST_MAX_KM,
+                                 max_lookups=AIRPORT_LOOKUP_MAX, lookup_window=AIRPORT_LOOKUP_WINDOW)
+cancellation_service = CancellationRate(airline_csv_file_path=AIRLINE_CANCEL_RATE_PATH, origin_csv_file_path=ORIGIN_CANCEL_RATE_PATH, route_csv_file_path=ROUTE_CANCEL_RATE_PATH, load=False)
+weather_cache = TTLCache(ttl=WEATHER_CACHE_TTL, maxsize=WEATHER_CACHE_MAXSIZE)
+# A concessão de uma consulta dura o deadline da Open-Meteo com folga, para sobreviver a um worker que morreu;
+# as chaves levam a impressão digital da configuração que define as features gravadas
+weather_shared_store = SharedWeatherStore(
+    WEATHER_SHARED_CACHE_PATH, ttl=WEATHER_CACHE_TTL, lease_timeout=WEATHER_DEADLINE + 2,
+    namespace=config_fingerprint(OPEN_METEO_URL, WEATHER_WINDOWS, WEATHER_GRID_RESOLUTION),
+    busy_timeout=WEATHER_SHARED_CACHE_BUSY_MS / 1000,
+) if WEATHER_SHARED_CACHE_PATH else None
+weather_service = WeatherService(airport_service, weather_client, weather_cache, shared_store=weather_shared_store,
+                                 stale_max_age=WEATHER_STALE_MAX_AGE)
+prediction_cache = PredictionCache(TTLCache(ttl=PREDICTION_CACHE_TTL, maxsize=PREDICTION_CACHE_MAXSIZE))
+
+reference_reloader = ReferenceDataReloader(
+    {"airports": airport_service, "cancel_rates": cancellation_service},
+    interval=REFERENCE_RELOAD_INTERVAL,
+)
+
+
+_load_lock = threading.Lock()
+
+
+def load_services():
+    """
+    Lê aeroportos e taxas de cancelamento, carrega e aquece o modelo e marca a API como pronta.
+    Bloqueante (chame em uma thread) e idempotente: com o gunicorn já roda no processo pai.
+    """
+    with _load_lock:
+        if startup.ready:
+            return
+        try:
+            with startup.phase("csv"):
+                airport_service.load()
+                cancellation_service.load()
+            with startup.phase("modelo"):
+                # Artefato ativado pelas rotas administrativas antes do reinício, se houver
+                model.model_path = model_registry.active_path() or model.model_path
+                model.load()
+            if not model.loaded:
+                raise RuntimeError(f"Modelo não carregado de {model.model_path}")
+            with startup.phase("warmup"):
+                model.warm_up()
+        except Exception as e:
+            startup.error = str(e)
+            print(f"--- ERRO na inicialização: {e} ---")
+            print(traceback.format_exc())
+            raise
+        startup.mark_ready()
+
+
+def require_ready():
+    """Recusa as previsões com 503 enquanto load_services não terminou."""
+    if not startup.ready:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                            detail="API em inicialização; consulte GET /ready.", headers={"Retry-After": "1"})
+
+
+def prefetch_airport_codes():
+    """Aeroportos configurados para o pré-carregamento do clima."""
+    if WEATHER_PREFETCH_AIRPORTS.strip().upper() == "ALL":
+        return airport_service.airport_codes()
+    return [code.strip().upper() for code in WEATHER_PREFETCH_AIRPORTS.split(",") if code.strip()]
+
+
+weather_prefetcher = WeatherPrefetcher(
+    weather_service,
+    prefetch_airport_codes,
+    interval=WEATHER_PREFETCH_INTERVAL,
+    hours_ahead=WEATHER_PREFETCH_HOURS_AHEAD,
+)
+
+
+def _weather_cache_metrics():
+    stats = weather_cache.stats()
+    return [({"stat": name}, stats[name]) for name in ("size", "hits", "misses", "evictions", "hit_rate")]
+
+
+def _prediction_cache_metrics():
+    stats = prediction_cache.stats()
+    return [({"stat": name}, stats[name]) for name in ("size", "hits", "misses", "stale", "evictions", "hit_rate")]
+
+
+def _weather_shared_cache_metrics():
+    if weather_shared_store is None:
+        return []
+    stats = weather_shared_store.stats()
+    return [({"stat": name}, stats[name]) for name in ("size", "hits", "misses", "hit_rate", "leases", "waits", "errors", "busy")
+            if stats[name] is not None]
+
+
+def _weather_circuit_metrics():
+    states = (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)
+    return [({"state": state}, int(weather_breaker.state == state)) for state in states]
+
+
+def _thread_pool_metrics():
+    # Pool de threads padrão do anyio (usado por to_thread.run_sync); só pode ser lido no event loop
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+    return [
+        ({"stat": "total"}, limiter.total_tokens),
+        ({"stat": "busy"}, statistics.borrowed_tokens),
+        ({"stat": "waiting"}, statistics.tasks_waiting),
+    ]
+
+
+metrics.gauge("weather_cache", "Estatísticas do cache meteorológico em memória.", _weather_cache_metrics)
+metrics.gauge("prediction_cache", "Estatísticas do cache de previsões.", _prediction_cache_metrics)
+metrics.gauge("weather_shared_cache", "Estatísticas do cache meteorológico compartilhado entre os workers (deste worker).", _weather_shared_cache_metrics)
+metrics.gauge("weather_circuit", "Estado do circuit breaker da Open-Meteo (1 no estado atual).", _weather_circuit_metrics)
+metrics.gauge("thread_pool", "Ocupação e fila do pool de threads padrão do anyio.", _thread_pool_metrics)
 
 router = APIRouter(
     prefix='/api/predict',
     tags=['predict'],
+    dependencies=[Depends(require_ready)],
 )
 
 
@@ -37,7 +215,8 @@ async def predict_flight_delay(input: FlightInput):
     
     try:  
         try:
-            coords = airport_service.get_coordinates_archive(input.origem)
+            with metrics.stage("coords"):
+                coords = await airport_service.resolve(input.origem)
             if coords is None:
                 raise HTTPException(status_code=404, detail=f"Coordenadas do aeroporto {input.origem} não encontradas.")
         except HTTPException: # Re-raise HTTPException
@@ -45,17 +224,19 @@ async def predict_flight_delay(input: FlightInput):
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Erro inesperado ao obter coordenadas do aeroporto: {e}")
 
-        weather_df = await anyio.to_thread.run_sync(
-        weather_client.get_weather_1h,        # A função a ser chamada
-        coords["lat"],                        # Primeiro argumento posicional
-        coords["lon"],                        # Segundo argumento posicional
-        input.data_partida                    # Terceiro argumento posicional
-        )
+        with metrics.stage("weather"):
+            weather_features = await weather_service.get_weather_features(input.origem, input.data_partida)
         
-        #final_features = enrich_with_weather(base_features, weather_json)
-        final_features = build_features(input, cancellation_service, weather_df)
-    
-        prediction_result = model.predict(final_features)
+        model_version, rates_version = model.version, cancellation_service.version
+        prediction_result = prediction_cache.get(input, weather_features, model_version, rates_version)
+        if prediction_result is None:
+            #final_features = enrich_with_weather(base_features, weather_json)
+            with metrics.stage("features"):
+                final_features = build_features(input, cancellation_service, weather_features)
+        
+            with metrics.stage("model"):
+                prediction_result = await micro_batcher.predict(final_features)
+            prediction_cache.set(input, weather_features, model_version, rates_version, prediction_result)
 
         previsao_str = prediction_result["prediction"]
         probabilidade_float = prediction_result["probability"]
@@ -63,7 +244,8 @@ async def predict_flight_delay(input: FlightInput):
 
         return {
             "previsao": previsao_str,
-            "probabilidade": probabilidade_float
+            "probabilidade": probabilidade_float,
+            "degradado": is_degraded(weather_features),
         }
     
     except HTTPException: # Re-lança qualquer HTTPException que já tenha sido gerado
@@ -76,6 +258,137 @@ async def predict_flight_delay(input: FlightInput):
         print(f"----------------------------------------------------------\n")
         raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {e}")
 
+@router.post(path="/batch", response_model=List[PredictionOutput], status_code=status.HTTP_201_CREATED)
+
+async def predict_flight_delay_batch(inputs: List[FlightInput]):
+
+    try:
+        # Consulta o clima uma única vez por (origem, partida) distinta
+        with metrics.stage("weather"):
+            weather_by_key = await _fetch_weather_features({(item.origem, item.data_partida) for item in inputs})
+        weather_features = [weather_by_key[(item.origem, item.data_partida)] for item in inputs]
+
+        prediction_results = _predict_batch(inputs, weather_features)
+
+        return [
+            {
+                "previsao": result["prediction"],
+                "probabilidade": result["probability"],
+                "degradado": is_degraded(weather),
+            }
+            for result, weather in zip(prediction_results, weather_features)
+        ]
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"\n--- Erro GENÉRICO não tratado na rota predict_flight_delay_batch ---")
+        print(f"Tipo de erro: {type(e).__name__}")
+        print(f"Mensagem: {e}")
+        print(traceback.format_exc())
+        print(f"----------------------------------------------------------\n")
+        raise HTTPException(status_code=500, detail=f"Erro interno do servidor: {e}")
+
+
+@router.post(path="/stream")
+
+async def predict_flight_delay_stream(request: Request):
+    """
+    Previsão de uma grade inteira de voos enviada em streaming: NDJSON (um FlightInput por linha) ou CSV
+    (Content-Type text/csv, com cabeçalho companhia,origem,destino,data_partida). A entrada é processada
+    em blocos de STREAM_CHUNK_SIZE voos e cada bloco é devolvido assim que fica pronto, em NDJSON:
+    {"linha", "previsao", "probabilidade", "degradado"} ou {"linha", "erro"} para linhas inválidas ou sem clima.
+    """
+    input_format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+
+    async def generate():
+        async for chunk in iter_flight_chunks(request.stream(), input_format, STREAM_CHUNK_SIZE):
+            results = await _predict_stream_chunk(chunk)
+            yield "".join(ndjson_line(result) for result in results)
+
+    return DuplexStreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+async def _predict_stream_chunk(chunk) -> List[dict]:
+    """Prevê um bloco da rota de streaming; erros viram linhas {"linha", "erro"} em vez de interromper o fluxo."""
+    errors = {line_number: item for line_number, item in chunk if isinstance(item, str)}
+    flights = [(line_number, item) for line_number, item in chunk if not isinstance(item, str)]
+
+    try:
+        unknown = set()
+        for origem in {item.origem for _, item in flights}:
+            try:
+                if await airport_service.resolve(origem) is None:
+                    unknown.add(origem)
+            except Exception:
+                unknown.add(origem)
+
+        keys = list({(item.origem, item.data_partida) for _, item in flights if item.origem not in unknown})
+        with metrics.stage("weather"):
+            weather_by_key = dict(zip(keys, await weather_service.get_weather_features_bulk(keys)))
+
+        scored = []
+        for line_number, item in flights:
+            if item.origem in unknown:
+                errors[line_number] = f"Coordenadas do aeroporto {item.origem} não encontradas."
+            else:
+                scored.append((line_number, item))
+
+        inputs = [item for _, item in scored]
+        predictions = _predict_batch(inputs, [weather_by_key[(item.origem, item.data_partida)] for item in inputs])
+    except Exception as e:
+        print(f"--- Erro ao processar bloco da rota predict_flight_delay_stream: {e} ---")
+        print(traceback.format_exc())
+        return [{"linha": line_number, "erro": f"Erro interno do servidor: {e}"} for line_number, _ in chunk]
+
+    results = {line_number: {"linha": line_number, "erro": message} for line_number, message in errors.items()}
+    for (line_number, item), result in zip(scored, predictions):
+        weather = weather_by_key[(item.origem, item.data_partida)]
+        results[line_number] = {"linha": line_number, "previsao": result["prediction"], "probabilidade": result["probability"],
+                                "degradado": is_degraded(weather)}
+    return [results[line_number] for line_number, _ in chunk]
+
+
+def _predict_batch(inputs: List[FlightInput], weather_features: List[dict]) -> List[dict]:
+    """Prevê vários voos já com o clima: usa o cache de previsões e uma única chamada ao modelo para o resto."""
+    model_version, rates_version = model.version, cancellation_service.version
+    prediction_results = [
+        prediction_cache.get(item, weather, model_version, rates_version)
+        for item, weather in zip(inputs, weather_features)
+    ]
+    missing = [index for index, result in enumerate(prediction_results) if result is None]
+
+    if missing:
+        # Features dos voos fora do cache em colunas e uma única chamada ao modelo
+        with metrics.stage("features"):
+            final_features = build_features_batch([inputs[i] for i in missing], cancellation_service,
+                                                  [weather_features[i] for i in missing])
+        with metrics.stage("model"):
+            computed = model.predict_batch(final_features)
+        for index, result in zip(missing, computed):
+            prediction_results[index] = result
+            prediction_cache.set(inputs[index], weather_features[index], model_version, rates_version, result)
+
+    return prediction_results
+
+
+async def _fetch_weather_features(keys) -> dict:
+    """
+    Busca as features meteorológicas de cada (origem, partida) com chamadas multi-localização.
+    Consultas que falham recebem o clima degradado (DegradedWeather), nunca None.
+    """
+    keys = list(keys)
+    for origem in {origem for origem, _ in keys}:
+        try:
+            coords = await airport_service.resolve(origem)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Erro inesperado ao obter coordenadas do aeroporto: {e}")
+        if coords is None:
+            raise HTTPException(status_code=404, detail=f"Coordenadas do aeroporto {origem} não encontradas.")
+
+    results = await weather_service.get_weather_features_bulk(keys)
+    return dict(zip(keys, results))
+
 #model = None
 #@router.on_event("startup")
 #def load_model():
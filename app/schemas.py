@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import Literal
 
 class FlightInput(BaseModel):
     companhia: str
@@ -11,4 +12,10 @@ class FlightInput(BaseModel):
 class PredictionOutput(BaseModel):
     previsao: str
     probabilidade: float
+    degradado: bool = False  # True se o clima veio do fallback (Open-Meteo indisponível)
 
+
+class ModelLoadInput(BaseModel):
+    arquivo: str  # nome do artefato .joblib dentro da pasta model/
+    modo: Literal["ativar", "sombra"] = "ativar"
+    amostragem: float = Field(default=0.1, ge=0.0, le=1.0)  # fração do tráfego enviada ao modelo sombra
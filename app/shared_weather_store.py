@@ -0,0 +1,298 @@
+"""
+Cache das features meteorológicas agregadas compartilhado entre os workers de um host.
+
+Um arquivo SQLite em modo WAL (leitores não bloqueiam o escritor) guarda, por (ponto da grade, hora UTC),
+o resultado de aggregate_weather_window em JSON com sua expiração. Na frente dele cada worker mantém o
+seu TTLCache em memória (ver WeatherService).
+
+As consultas à Open-Meteo são deduplicadas entre os workers por uma concessão (lease) por chave: o
+worker que a obtém busca o clima e grava o resultado; os demais esperam a gravação (ou o fim da
+concessão, se o dono falhar) em vez de repetir a chamada. Uma concessão expira sozinha depois de
+lease_timeout segundos, para o caso de o worker dono morrer no meio da consulta.
+
+As chaves levam um prefixo (namespace) com a impressão digital da configuração que define as features
+(URL da Open-Meteo, janelas, resolução da grade): instâncias com outra configuração usando o mesmo
+arquivo não leem as entradas umas das outras.
+
+As chamadas ao SQLite rodam em uma thread dedicada do worker, fora do event loop; as concessões e as
+gravações de um lote são feitas em uma única transação. A espera por um bloqueio do arquivo é limitada
+a busy_timeout (poucos milissegundos). Erros do SQLite, inclusive o arquivo ocupado por outro worker,
+nunca derrubam uma previsão: são contados e tratados como ausência no cache.
+
+Requisições do mesmo worker pela mesma chave não chegam aqui em duplicidade: WeatherService as junta
+antes, em uma única busca em andamento por chave.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS weather (
+    key TEXT PRIMARY KEY,
+    features TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+# Intervalo (s) entre as verificações de quem espera a consulta feita por outro worker
+POLL_INTERVAL = 0.02
+# Gravações entre duas limpezas das entradas expiradas
+PURGE_EVERY = 1000
+# Limite de parâmetros por consulta das versões antigas do SQLite
+MAX_PARAMS = 500
+
+
+def shared_key(key: tuple, namespace: str = "") -> str:
+    """Chave textual de weather_cache_key: "<namespace>|-22.8,-43.2|2025-01-01T12:00:00+00:00"."""
+    (lat, lon), hour = key
+    return f"{namespace}|{lat},{lon}|{hour.isoformat()}"
+
+
+def config_fingerprint(*values) -> str:
+    """Impressão digital curta dos valores de configuração que definem as features gravadas."""
+    return hashlib.sha1(repr(values).encode()).hexdigest()[:12]
+
+
+class SharedWeatherStore:
+    """Tabela de features meteorológicas e de concessões em um arquivo SQLite (WAL) comum aos workers."""
+
+    def __init__(self, path, ttl: float = 3600, lease_timeout: float = 10.0, refresh_grace: float = 60.0,
+                 namespace: str = "", busy_timeout: float = 0.005):
+        self.path = str(path)
+        self.ttl = ttl
+        self.lease_timeout = lease_timeout
+        # Com refresh=True, entradas gravadas há menos de refresh_grace segundos (por outro worker) são aceitas
+        self.refresh_grace = refresh_grace
+        self.namespace = namespace
+        self.busy_timeout = busy_timeout
+        self.hits = 0
+        self.misses = 0
+        self.leases = 0
+        self.waits = 0
+        self.errors = 0
+        self.busy = 0
+        self._writes = 0
+        self._connection = None
+        self._executor = None
+        self._executor_pid = None
+        self._pid = None
+        # Entradas válidas desta configuração, contadas na thread do SQLite a cada gravação
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Uma conexão por processo: com preload_app os workers são criados por fork depois do import
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    async def _run(self, function: Callable, *args):
+        # Executa function na thread do SQLite deste processo (criada de novo em cada worker após o fork)
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weather-store")
+            self._executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    def _error(self, e: sqlite3.Error):
+        if isinstance(e, sqlite3.OperationalError) and ("locked" in str(e) or "busy" in str(e)):
+            # Arquivo ocupado por outro worker além de busy_timeout: ausência, sem log por requisição
+            self.busy += 1
+            return
+        self.errors += 1
+        print(f"--- Erro no cache meteorológico compartilhado ({self.path}): {e} ---")
+
+    def _execute(self, sql: str, params: Iterable = ()) -> Optional[sqlite3.Cursor]:
+        try:
+            with self._lock:
+                return self._connect().execute(sql, tuple(params))
+        except sqlite3.Error as e:
+            self._error(e)
+            return None
+
+    def _transaction(self, statements: Callable[[sqlite3.Connection], object]):
+        # Executa statements(connection) em uma única transação; None se o SQLite falhar
+        try:
+            with self._lock:
+                connection = self._connect()
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    result = statements(connection)
+                    connection.execute("COMMIT")
+                    return result
+                except BaseException:
+                    if connection.in_transaction:
+                        connection.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            self._error(e)
+            return None
+
+    def _texts(self, keys: List[tuple]) -> Dict[str, tuple]:
+        return {shared_key(key, self.namespace): key for key in keys}
+
+    async def get_many(self, keys: List[tuple], max_age: Optional[float] = None) -> Dict[tuple, dict]:
+        """Entradas válidas das chaves pedidas (e gravadas há no máximo max_age segundos, se informado)."""
+        if not keys:
+            return {}
+        found = await self._run(self._lookup, keys, max_age)
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    async def get(self, key: tuple, max_age: Optional[float] = None) -> Optional[dict]:
+        return (await self.get_many([key], max_age)).get(key)
+
+    def _lookup(self, keys: List[tuple], max_age: Optional[float]) -> Dict[tuple, dict]:
+        by_text = self._texts(keys)
+        now = time.time()
+        min_stored_at = now - max_age if max_age is not None else float("-inf")
+
+        found = {}
+        texts = list(by_text)
+        for offset in range(0, len(texts), MAX_PARAMS):
+            chunk = texts[offset:offset + MAX_PARAMS]
+            cursor = self._execute(
+                f"SELECT key, features FROM weather WHERE key IN ({','.join('?' * len(chunk))}) "
+                "AND expires_at > ? AND stored_at >= ?",
+                [*chunk, now, min_stored_at],
+            )
+            if cursor is None:
+                break
+            for text, features in cursor.fetchall():
+                found[by_text[text]] = json.loads(features)
+        return found
+
+    async def set_many(self, items: Dict[tuple, dict]):
+        """Grava as features de várias chaves em uma única transação."""
+        if items:
+            await self._run(self._set_many, items)
+
+    def _set_many(self, items: Dict[tuple, dict]):
+        now = time.time()
+        rows = [(shared_key(key, self.namespace), json.dumps(features), now, now + self.ttl) for key, features in items.items()]
+        self._transaction(lambda connection: connection.executemany(
+            "INSERT OR REPLACE INTO weather (key, features, stored_at, expires_at) VALUES (?, ?, ?, ?)", rows))
+
+        previous, self._writes = self._writes, self._writes + len(rows)
+        if previous // PURGE_EVERY != self._writes // PURGE_EVERY:
+            self._execute("DELETE FROM weather WHERE expires_at <= ?", (now,))
+            self._execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+        cursor = self._execute("SELECT COUNT(*) FROM weather WHERE key LIKE ? AND expires_at > ?",
+                               (f"{self.namespace}|%", now))
+        if cursor is not None:
+            self._size = cursor.fetchone()[0]
+
+    async def acquire_many(self, keys: List[tuple]) -> set:
+        """
+        Tenta obter as concessões das consultas de keys (uma única transação). Retorna as chaves obtidas;
+        as demais já estão com outro worker.
+        """
+        if not keys:
+            return set()
+        acquired = await self._run(self._acquire_many, keys)
+        if acquired is None:
+            # Sem o SQLite, cada worker consulta por conta própria
+            acquired = set(keys)
+        self.leases += len(acquired)
+        return acquired
+
+    def _acquire_many(self, keys: List[tuple]) -> Optional[set]:
+        now = time.time()
+        owner = str(os.getpid())
+
+        def statements(connection):
+            acquired = set()
+            for text, key in self._texts(keys).items():
+                cursor = connection.execute(
+                    "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                    "WHERE leases.expires_at <= ?",
+                    (text, owner, now + self.lease_timeout, now),
+                )
+                if cursor.rowcount == 1:
+                    acquired.add(key)
+            return acquired
+
+        return self._transaction(statements)
+
+    async def release_many(self, keys: Iterable[tuple]):
+        keys = list(keys)
+        if keys:
+            await self._run(self._release_many, keys)
+
+    def _release_many(self, keys: List[tuple]):
+        owner = str(os.getpid())
+        self._transaction(lambda connection: connection.executemany(
+            "DELETE FROM leases WHERE key = ? AND owner = ?", [(text, owner) for text in self._texts(keys)]))
+
+    def _leased(self, keys: List[tuple]) -> set:
+        # Chaves com concessão em vigor
+        texts = self._texts(keys)
+        leased = set()
+        text_list = list(texts)
+        for offset in range(0, len(text_list), MAX_PARAMS):
+            chunk = text_list[offset:offset + MAX_PARAMS]
+            cursor = self._execute(
+                f"SELECT key FROM leases WHERE key IN ({','.join('?' * len(chunk))}) AND expires_at > ?",
+                [*chunk, time.time()],
+            )
+            if cursor is None:
+                return set()
+            leased.update(texts[text] for text, in cursor.fetchall())
+        return leased
+
+    async def wait_many(self, keys: List[tuple], max_age: Optional[float] = None) -> Dict[tuple, dict]:
+        """
+        Espera os outros workers, donos das concessões, gravarem as chaves. Retorna as features recebidas;
+        chaves cuja concessão terminou (ou expirou) sem gravação ficam de fora, e quem esperava faz
+        a consulta por conta própria.
+        """
+        self.waits += len(keys)
+        deadline = time.monotonic() + self.lease_timeout
+        received, pending = {}, list(keys)
+        while pending:
+            received.update(await self._run(self._lookup, pending, max_age))
+            pending = [key for key in pending if key not in received]
+            if not pending or time.monotonic() >= deadline:
+                break
+            leased = await self._run(self._leased, pending)
+            pending = [key for key in pending if key in leased]
+            if pending:
+                await asyncio.sleep(POLL_INTERVAL)
+        return received
+
+    async def wait(self, key: tuple, max_age: Optional[float] = None) -> Optional[dict]:
+        return (await self.wait_many([key], max_age)).get(key)
+
+    def stats(self) -> dict:
+        # Sem acesso ao SQLite: chamado no event loop (GET /api/admin/cache e /metrics)
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "namespace": self.namespace,
+            "size": self._size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "leases": self.leases,
+            "waits": self.waits,
+            "errors": self.errors,
+            "busy": self.busy,
+        }
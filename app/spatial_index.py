@@ -0,0 +1,64 @@
+"""
+Índice espacial dos aeroportos e grade de clima.
+
+snap_to_grid leva as coordenadas ao ponto mais próximo de uma grade regular (resolução em graus):
+aeroportos na mesma célula da grade do modelo meteorológico (ex: GIG/SDU, GRU/CGH com resolução
+grossa) compartilham a chave do cache de clima e uma única consulta à Open-Meteo.
+
+AirportIndex é uma KD-tree (scipy) sobre os aeroportos do CSV, em coordenadas 3D na esfera unitária
+(a distância euclidiana entre dois pontos, a corda, cresce com a distância na superfície), usada
+para achar o aeroporto conhecido mais próximo de um ponto.
+"""
+import math
+from typing import List, Optional, Tuple
+import numpy as np
+from app.reference_tables import ReferenceTable
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def snap_to_grid(lat: float, lon: float, resolution: float) -> Tuple[float, float]:
+    """Ponto da grade de resolution graus mais próximo de (lat, lon); resolution <= 0 mantém as coordenadas."""
+    if resolution <= 0:
+        return round(lat, 5), round(lon, 5)
+    # round final desfaz o ruído de ponto flutuante (ex: 0.30000000000000004)
+    return round(round(lat / resolution) * resolution, 5), round(round(lon / resolution) * resolution, 5)
+
+
+def _unit_vectors(lat, lon) -> np.ndarray:
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def _chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+def _km_to_chord(km: float) -> float:
+    if km >= math.pi * EARTH_RADIUS_KM:
+        return float("inf")
+    return 2 * math.sin(km / (2 * EARTH_RADIUS_KM))
+
+
+class AirportIndex:
+    """KD-tree dos aeroportos para a busca do mais próximo."""
+
+    def __init__(self, codes: List[str], lat: np.ndarray, lon: np.ndarray):
+        # Importado só aqui: a árvore é montada ao carregar os aeroportos, fora do import da API
+        from scipy.spatial import cKDTree
+
+        self.codes = codes
+        self.tree = cKDTree(_unit_vectors(lat, lon)) if len(codes) else None
+
+    @classmethod
+    def from_table(cls, table: ReferenceTable) -> "AirportIndex":
+        return cls(table.code_list(), table.data["latitude"], table.data["longitude"])
+
+    def nearest(self, lat: float, lon: float, max_km: float = float("inf")) -> Optional[Tuple[str, float]]:
+        """(código, distância em km) do aeroporto mais próximo, ou None se nenhum estiver a até max_km."""
+        if self.tree is None:
+            return None
+        chord, i = self.tree.query(_unit_vectors([lat], [lon])[0], distance_upper_bound=_km_to_chord(max_km))
+        if math.isinf(chord):
+            return None
+        return self.codes[i], _chord_to_km(chord)
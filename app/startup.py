@@ -0,0 +1,51 @@
+"""
+Relatório da inicialização da API: duração de cada fase (imports, csv, modelo, warmup) e prontidão.
+
+O import de app.main não lê arquivos nem carrega o modelo; isso é feito por routers.load_services,
+chamado pelo lifespan em uma thread (o servidor já aceita conexões e GET /ready responde 503 até o
+fim) ou, com o gunicorn, uma única vez no processo pai antes do fork dos workers (ver gunicorn.conf.py).
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class StartupReport:
+    """Fases medidas da inicialização deste processo e se a API já pode receber tráfego."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.error: Optional[str] = None
+        self.started_at = time.perf_counter()
+        self.ready_at: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mede uma fase da inicialização (segundos) e a registra no relatório."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.phases[name] = elapsed
+            print(f"--- Inicialização: {name} em {elapsed * 1000:.0f} ms ---")
+
+    def mark_ready(self):
+        self.ready = True
+        self.ready_at = time.perf_counter()
+        print(f"--- API pronta em {self.ready_at - self.started_at:.2f}s ({self.summary()}) ---")
+
+    def summary(self) -> str:
+        return ", ".join(f"{name}: {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+
+    def describe(self) -> dict:
+        return {
+            "pronto": self.ready,
+            "fases_s": {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            "total_s": round(self.ready_at - self.started_at, 4) if self.ready_at is not None else None,
+            "erro": self.error,
+        }
+
+
+startup = StartupReport()
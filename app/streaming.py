@@ -0,0 +1,94 @@
+"""
+Leitura incremental de grades de voos (NDJSON ou CSV) para a rota de previsão em streaming.
+
+O corpo da requisição é consumido aos poucos e entregue em blocos de tamanho limitado; o próximo bloco
+só é lido depois que o anterior foi processado e enviado, então a memória fica constante e um cliente
+lento para ler as respostas desacelera a leitura da entrada (backpressure).
+"""
+import codecs
+import csv
+import json
+from typing import AsyncIterator, List, Tuple, Union
+from pydantic import ValidationError
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from app.schemas import FlightInput
+
+# Linha do arquivo de entrada (1 = primeira linha) e o voo validado ou a mensagem de erro
+ParsedLine = Tuple[int, Union[FlightInput, str]]
+
+
+async def iter_lines(byte_stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Gera (número da linha, texto) a partir de um fluxo de bytes UTF-8, sem ler tudo na memória."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    line_number = 0
+    async for data in byte_stream:
+        buffer += decoder.decode(data)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line.rstrip("\r")
+
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield line_number + 1, buffer.rstrip("\r")
+
+
+async def iter_flight_chunks(byte_stream: AsyncIterator[bytes], input_format: str, chunk_size: int) -> AsyncIterator[List[ParsedLine]]:
+    """
+    Gera blocos de até chunk_size linhas validadas como FlightInput. input_format é "ndjson" (um objeto
+    JSON por linha) ou "csv" (primeira linha com os nomes dos campos de FlightInput). Linhas em branco
+    são ignoradas; linhas inválidas seguem no bloco com a mensagem de erro.
+    """
+    header = None
+    chunk = []
+    async for line_number, line in iter_lines(byte_stream):
+        if not line.strip():
+            continue
+
+        if input_format == "csv":
+            row = next(csv.reader([line]))
+            if header is None:
+                header = [field.strip() for field in row]
+                continue
+            chunk.append((line_number, _validate(lambda: dict(zip(header, row)))))
+        else:
+            chunk.append((line_number, _validate(lambda: json.loads(line))))
+
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que lê o corpo da requisição enquanto envia a resposta. O StreamingResponse padrão
+    (ASGI < 2.4) roda uma tarefa que consome receive() esperando a desconexão e roubaria as mensagens
+    do corpo; aqui a desconexão aparece como ClientDisconnect na leitura do corpo ou OSError no envio.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+        if self.background is not None:
+            await self.background()
+
+
+def ndjson_line(payload: dict) -> str:
+    return json.dumps(payload, ensure_ascii=False) + "\n"
+
+
+def _validate(parse) -> Union[FlightInput, str]:
+    try:
+        return FlightInput.model_validate(parse())
+    except json.JSONDecodeError as e:
+        return f"JSON inválido: {e.msg}"
+    except ValidationError as e:
+        return "; ".join(f"{'.'.join(str(part) for part in error['loc']) or 'entrada'}: {error['msg']}" for error in e.errors())
@@ -1,13 +1,53 @@
+import os
 import traceback
-import openmeteo_requests
 import asyncio
-import pandas as pd
-import requests_cache
-from retry_requests import retry
+import httpx
+import numpy as np
 from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from app import metrics
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.weather_features import WEATHER_WINDOWS, HourlyWeather, aggregate_weather_window
+
+# Configurável para apontar para um servidor local (ex: benchmarks/fake_open_meteo.py)
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+HOURLY_VARIABLES = ("windspeed_10m", "cloudcover", "rain", "snowfall")
+# Mesmos status retentados por retry_requests
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Máximo de localizações por chamada multi-localização (limita o tamanho da URL)
+BULK_MAX_LOCATIONS = 100
+
+
+def date_window(departure: datetime, hours: int = max(WEATHER_WINDOWS)) -> Tuple[str, str]:
+    """Datas (start_date, end_date) consultadas na Open-Meteo para cobrir a maior janela antes da partida."""
+    start = departure - timedelta(hours=hours)
+    return start.strftime("%Y-%m-%d"), departure.strftime("%Y-%m-%d")
+
+
+def group_by_date_window(points: List[Tuple[float, float, datetime]], max_locations: int = BULK_MAX_LOCATIONS):
+    """
+    Agrupa os pontos (lat, lon, partida) por janela de datas, para uma chamada multi-localização por grupo.
+    Gera (start_date, end_date, localizações únicas, índices dos pontos de cada localização).
+    """
+    groups = {}
+    for index, (lat, lon, departure) in enumerate(points):
+        locations = groups.setdefault(date_window(departure), {})
+        locations.setdefault((lat, lon), []).append(index)
+
+    for (start_date, end_date), locations in groups.items():
+        items = list(locations.items())
+        for offset in range(0, len(items), max_locations):
+            chunk = items[offset:offset + max_locations]
+            yield start_date, end_date, [location for location, _ in chunk], [indices for _, indices in chunk]
+
 
 class WeatherClient:
     def __init__(self, cache_file='.cache', expire_after=3600):
+        # Dependências só do cliente síncrono, importadas sob demanda para não atrasar o import da API
+        import openmeteo_requests
+        import requests_cache
+        from retry_requests import retry
+
         # Setup a session with a cache and retry logic
         cache_session = requests_cache.CachedSession(cache_file, expire_after=expire_after)
         self.retry_session = retry(cache_session, retries=5, backoff_factor=0.2)
@@ -15,10 +55,9 @@ class WeatherClient:
 
     # 
     def get_weather_1h(self, lat: float, lon: float, departure: datetime):
-        start = departure - timedelta(hours=1)
-        end = departure
+        start_date, end_date = date_window(departure)
 
-        url = "https://api.open-meteo.com/v1/forecast"
+        url = OPEN_METEO_URL
 
         params = {
             "latitude": lat,
@@ -27,8 +66,8 @@ class WeatherClient:
                       "cloudcover,"
                       "rain,"
                       "snowfall",
-            "start_date": start.strftime("%Y-%m-%d"),
-            "end_date": end.strftime("%Y-%m-%d"),
+            "start_date": start_date,
+            "end_date": end_date,
             "timezone": "UTC"
         }
 
@@ -44,27 +83,8 @@ class WeatherClient:
             print(f"Elevation: {response.Elevation()} m asl")
             print(f"Timezone difference to GMT+0: {response.UtcOffsetSeconds()}s")
         
-            # Process hourly data
-            hourly = response.Hourly()
-            hourly_windspeed = hourly.Variables(0).ValuesAsNumpy()  # Exemplo de como acessar os dados
-            hourly_cloudcover = hourly.Variables(1).ValuesAsNumpy()
-            hourly_rain = hourly.Variables(2).ValuesAsNumpy()
-            hourly_snowfall = hourly.Variables(3).ValuesAsNumpy()
-
-            hourly_data = {
-                    "date": pd.date_range(
-                        start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-                        end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-                        freq=pd.Timedelta(seconds=hourly.Interval()),
-                        inclusive="left"
-                    ),
-                    "windspeed_10m": hourly_windspeed,
-                    "cloudcover": hourly_cloudcover,
-                    "rain": hourly_rain,
-                    "snowfall": hourly_snowfall
-                }
-            # Return the data as a DataFrame
-            return pd.DataFrame(data=hourly_data)
+            # Return the data as NumPy arrays (HourlyWeather.to_frame() gera o DataFrame antigo)
+            return self._response_to_hourly(response)
         # As exceções que você tinha antes estão corretas para o openmeteo_requests também
         except Exception as exc:
             print(f"An unexpected error occurred in WeatherClient.get_weather_1h: {exc}")
@@ -72,5 +92,203 @@ class WeatherClient:
             print(traceback.format_exc()) # Isso imprimirá o traceback completo
             # --------------------------
             return None
-        
-  
+
+    def get_weather_1h_bulk(self, points: List[Tuple[float, float, datetime]]) -> List[Optional[dict]]:
+        """
+        Versão multi-localização de get_weather_1h: recebe vários (lat, lon, partida) e faz uma chamada
+        à Open-Meteo por janela de datas. Retorna as features de cada ponto (aggregate_weather_window), na mesma ordem
+        (None para os pontos cuja consulta falhou ou veio sem dado, ver aggregate_weather_window).
+        """
+        results = [None] * len(points)
+
+        for start_date, end_date, locations, indices in group_by_date_window(points):
+            params = {
+                "latitude": [lat for lat, _ in locations],
+                "longitude": [lon for _, lon in locations],
+                "hourly": ",".join(HOURLY_VARIABLES),
+                "start_date": start_date,
+                "end_date": end_date,
+                "timezone": "UTC"
+            }
+
+            try:
+                # Uma resposta por localização, na ordem dos parâmetros
+                responses = self.openmeteo_client.weather_api(OPEN_METEO_URL, params=params)
+                for response, location_indices in zip(responses, indices):
+                    # Um único array por localização, fatiado na janela de cada partida
+                    hourly = self._response_to_hourly(response)
+                    for index in location_indices:
+                        results[index] = aggregate_weather_window(hourly, points[index][2])
+            except Exception as exc:
+                print(f"An unexpected error occurred in WeatherClient.get_weather_1h_bulk: {exc}")
+                print(traceback.format_exc())
+
+        return results
+
+    @staticmethod
+    def _response_to_hourly(response) -> HourlyWeather:
+        # Process hourly data, mantendo as variáveis como os arrays NumPy de ValuesAsNumpy()
+        hourly = response.Hourly()
+        return HourlyWeather(
+            time=np.arange(hourly.Time(), hourly.TimeEnd(), hourly.Interval(), dtype=np.int64),
+            windspeed_10m=hourly.Variables(0).ValuesAsNumpy(),
+            cloudcover=hourly.Variables(1).ValuesAsNumpy(),
+            rain=hourly.Variables(2).ValuesAsNumpy(),
+            snowfall=hourly.Variables(3).ValuesAsNumpy(),
+        )
+
+
+class AsyncWeatherClient:
+    """
+    Cliente assíncrono da API Open-Meteo sobre um httpx.AsyncClient compartilhado (pool de conexões).
+    Requisições simultâneas para o mesmo (lat, lon, datas) são agrupadas em uma única chamada.
+    deadline limita o tempo total de uma chamada, incluindo as retentativas; com um breaker, as falhas
+    seguidas abrem o circuito e as chamadas seguintes falham na hora (CircuitOpenError) sem tocar na rede.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive_connections: int = 20,
+                 timeout: float = 10.0, retries: int = 5, backoff_factor: float = 0.2,
+                 deadline: Optional[float] = None, breaker: Optional[CircuitBreaker] = None):
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.deadline = deadline
+        self.breaker = breaker
+        self._client = None
+        self._inflight = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_weather_1h(self, lat: float, lon: float, departure: datetime):
+        key = (lat, lon, *date_window(departure))
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(*key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # shield: o cancelamento de um chamador não cancela a busca compartilhada
+        return await asyncio.shield(task)
+
+    async def _fetch(self, lat: float, lon: float, start_date: str, end_date: str):
+        params = {
+            "latitude": lat,
+            "longitude": lon,
+            "hourly": ",".join(HOURLY_VARIABLES),
+            "start_date": start_date,
+            "end_date": end_date,
+            "timezone": "UTC",
+            "timeformat": "unixtime",
+        }
+
+        try:
+            payload = await self._request(params)
+            return self._payload_to_hourly(payload)
+        except CircuitOpenError:
+            return None
+        except asyncio.TimeoutError:
+            print(f"--- Consulta à Open-Meteo excedeu o deadline de {self.deadline}s ---")
+            return None
+        except Exception as exc:
+            print(f"An unexpected error occurred in AsyncWeatherClient.get_weather_1h: {exc}")
+            print(traceback.format_exc())
+            return None
+
+    async def get_weather_1h_bulk(self, points: List[Tuple[float, float, datetime]]) -> List[Optional[dict]]:
+        """
+        Versão multi-localização de get_weather_1h: recebe vários (lat, lon, partida) e faz uma chamada
+        à Open-Meteo por janela de datas. Retorna as features de cada ponto (aggregate_weather_window), na mesma ordem
+        (None para os pontos cuja consulta falhou ou veio sem dado, ver aggregate_weather_window).
+        """
+        results = [None] * len(points)
+
+        async def fetch_group(start_date, end_date, locations, indices):
+            params = {
+                "latitude": ",".join(str(lat) for lat, _ in locations),
+                "longitude": ",".join(str(lon) for _, lon in locations),
+                "hourly": ",".join(HOURLY_VARIABLES),
+                "start_date": start_date,
+                "end_date": end_date,
+                "timezone": "UTC",
+                "timeformat": "unixtime",
+            }
+
+            try:
+                payload = await self._request(params)
+                # Com várias localizações a API retorna uma lista, na ordem dos parâmetros
+                payloads = payload if isinstance(payload, list) else [payload]
+                for location_payload, location_indices in zip(payloads, indices):
+                    # Um único array por localização, fatiado na janela de cada partida
+                    hourly = self._payload_to_hourly(location_payload)
+                    for index in location_indices:
+                        results[index] = aggregate_weather_window(hourly, points[index][2])
+            except CircuitOpenError:
+                pass
+            except asyncio.TimeoutError:
+                print(f"--- Consulta multi-localização à Open-Meteo excedeu o deadline de {self.deadline}s ---")
+            except Exception as exc:
+                print(f"An unexpected error occurred in AsyncWeatherClient.get_weather_1h_bulk: {exc}")
+                print(traceback.format_exc())
+
+        await asyncio.gather(*(fetch_group(*group) for group in group_by_date_window(points)))
+        return results
+
+    @staticmethod
+    def _payload_to_hourly(payload: dict) -> HourlyWeather:
+        hourly = payload["hourly"]
+        return HourlyWeather(
+            time=np.asarray(hourly["time"], dtype=np.int64),
+            **{variable: np.asarray(hourly[variable], dtype=np.float32) for variable in HOURLY_VARIABLES},
+        )
+
+    async def _request(self, params: dict) -> dict:
+        """_get_with_retry dentro do deadline, passando pelo circuit breaker (se configurado)."""
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("Circuito da Open-Meteo aberto")
+
+        try:
+            payload = await asyncio.wait_for(self._get_with_retry(params), self.deadline)
+        except httpx.HTTPStatusError as exc:
+            # Erros 4xx (exceto 429) indicam uma consulta inválida, não uma falha da dependência
+            if self.breaker is not None and (exc.response.status_code >= 500 or exc.response.status_code == 429):
+                self.breaker.record_failure()
+            raise
+        except (httpx.HTTPError, asyncio.TimeoutError, ValueError):
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return payload
+
+    async def _get_with_retry(self, params: dict) -> dict:
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                response = await self.client.get(OPEN_METEO_URL, params=params)
+                metrics.WEATHER_UPSTREAM_REQUESTS.inc(result=str(response.status_code))
+                if response.status_code in RETRY_STATUSES and not last_attempt:
+                    metrics.WEATHER_UPSTREAM_RETRIES.inc()
+                    await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                    continue
+                response.raise_for_status()
+                return response.json()
+            except httpx.TransportError:
+                metrics.WEATHER_UPSTREAM_REQUESTS.inc(result="transport_error")
+                if last_attempt:
+                    raise
+                metrics.WEATHER_UPSTREAM_RETRIES.inc()
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
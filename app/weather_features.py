@@ -1,24 +1,155 @@
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional, Sequence
+import numpy as np
+import os
 import pandas as pd
 
-def aggregate_weather_1h(weather_df: pd.DataFrame) -> dict:
+# Janelas (em horas antes da partida) das features meteorológicas, ex: "1,3,6".
+# Cada janela h gera wind_max_{h}h, cloud_mean_{h}h, rain_sum_{h}h e snow_sum_{h}h.
+WEATHER_WINDOWS = tuple(sorted({int(hours) for hours in os.environ.get("WEATHER_WINDOWS", "1").split(",") if hours.strip()}))
+
+# Valores horários típicos usados quando não há dado meteorológico (dependência fora do ar e nenhum
+# dado anterior do aeroporto): vento máximo (km/h), nebulosidade média (%), chuva e neve (mm por hora)
+CLIMATOLOGY_HOURLY = {"wind_max": 12.0, "cloud_mean": 50.0, "rain_sum": 0.1, "snow_sum": 0.0}
+
+
+class HourlyWeather(NamedTuple):
     """
-    Agrega as features climáticas de um DataFrame de dados horários.
-    Assume que o DataFrame contém dados para o período relevante (e.g., a última hora).
+    Dados horários da Open-Meteo como arrays NumPy (o que ValuesAsNumpy() já retorna),
+    sem montar um DataFrame. time contém os instantes UTC em segundos Unix.
     """
+    time: np.ndarray
+    windspeed_10m: np.ndarray
+    cloudcover: np.ndarray
+    rain: np.ndarray
+    snowfall: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        """Converte para o DataFrame horário no formato antigo de get_weather_1h."""
+        return pd.DataFrame({
+            "date": pd.to_datetime(self.time, unit="s", utc=True),
+            "windspeed_10m": self.windspeed_10m,
+            "cloudcover": self.cloudcover,
+            "rain": self.rain,
+            "snowfall": self.snowfall,
+        })
+
+
+def aggregate_weather_1h(weather) -> Optional[dict]:
+    """
+    Agrega as features climáticas de dados horários (HourlyWeather ou DataFrame).
+    Assume que os dados cobrem o período relevante (e.g., a última hora); para selecionar
+    as horas antes da partida use aggregate_weather_window.
+    Retorna None se o vento ou a nebulosidade vierem todos nulos (dado ausente, ver _without_nan).
+    """
+    if isinstance(weather, HourlyWeather):
+        return _without_nan(_aggregate_arrays(weather))
+
+    weather_df = weather
     if weather_df.empty:
-        return {
-            "wind_max_1h": 0.0,
-            "cloud_mean_1h": 0.0,
-            "rain_sum_1h": 0.0,
-            "snow_sum_1h": 0.0,
-        }
+        return _empty_weather()
 
     # Calcula as agregações sobre o DataFrame.
     # Se o DataFrame contiver apenas uma linha (um único forecast horário),
     # .max(), .mean(), .sum() simplesmente retornarão esse valor.
-    return {
+    return _without_nan({
         "wind_max_1h": weather_df["windspeed_10m"].max(),
         "cloud_mean_1h": weather_df["cloudcover"].mean(),
         "rain_sum_1h": weather_df["rain"].sum(),
         "snow_sum_1h": weather_df["snowfall"].sum(),
+    })
+
+
+def aggregate_weather_window(weather: HourlyWeather, departure: datetime, windows: Sequence[int] = WEATHER_WINDOWS) -> Optional[dict]:
+    """
+    Agrega as features climáticas apenas das horas dentro de cada janela antes da partida.
+    A janela de h horas cobre os instantes em (partida - h, partida]: exatamente h amostras horárias,
+    iguais para qualquer partida dentro da mesma hora. Os limites são encontrados por busca binária
+    em weather.time e todas as janelas são calculadas em uma única passada vetorizada.
+    Horas nulas são ignoradas; se o vento ou a nebulosidade de uma janela vierem todos nulos, retorna
+    None e quem chamou trata como consulta sem dado (fallback), sem guardar nada no cache.
+    """
+    hours = np.asarray(windows, dtype=np.int64)
+    departure_ts = _timestamp(departure)
+
+    # Todas as janelas terminam na partida; só o início muda
+    end = int(np.searchsorted(weather.time, departure_ts, side="right"))
+    starts = np.searchsorted(weather.time, departure_ts - hours * 3600, side="right")
+    lo = min(int(starts.min()), end)
+
+    # Bloco (variável x hora) das horas usadas, invertido para que as acumuladas partam da partida:
+    # o valor na posição k agrega as k + 1 horas mais próximas da partida
+    block = np.vstack([weather.windspeed_10m[lo:end], weather.cloudcover[lo:end],
+                       weather.rain[lo:end], weather.snowfall[lo:end]]).astype(np.float64)[:, ::-1]
+    wind_max = np.fmax.accumulate(block[0])
+    cloud_sum, rain_sum, snow_sum = np.nancumsum(block[1:], axis=1)
+    cloud_count = np.cumsum(~np.isnan(block[1]))
+
+    positions = end - 1 - starts
+    features = {}
+    for window_hours, k in zip(hours.tolist(), positions.tolist()):
+        if k < 0:
+            features.update(_empty_weather(window_hours))
+            continue
+
+        features[f"wind_max_{window_hours}h"] = float(wind_max[k])
+        features[f"cloud_mean_{window_hours}h"] = float(cloud_sum[k] / cloud_count[k]) if cloud_count[k] else float("nan")
+        features[f"rain_sum_{window_hours}h"] = float(rain_sum[k])
+        features[f"snow_sum_{window_hours}h"] = float(snow_sum[k])
+
+    return _without_nan(features)
+
+
+def climatology_weather(windows: Sequence[int] = WEATHER_WINDOWS) -> dict:
+    """Features meteorológicas climatológicas de cada janela (somas proporcionais ao número de horas)."""
+    features = {}
+    for window_hours in windows:
+        features[f"wind_max_{window_hours}h"] = CLIMATOLOGY_HOURLY["wind_max"]
+        features[f"cloud_mean_{window_hours}h"] = CLIMATOLOGY_HOURLY["cloud_mean"]
+        features[f"rain_sum_{window_hours}h"] = CLIMATOLOGY_HOURLY["rain_sum"] * window_hours
+        features[f"snow_sum_{window_hours}h"] = CLIMATOLOGY_HOURLY["snow_sum"] * window_hours
+    return features
+
+
+def _without_nan(features: dict) -> Optional[dict]:
+    # Uma feature NaN chegaria ao modelo (probabilidade NaN, que não serializa em JSON) e ao cache
+    if any(np.isnan(value) for value in features.values()):
+        return None
+    return features
+
+
+def _timestamp(departure: datetime) -> int:
+    # Datas sem fuso são tratadas como UTC, como na consulta à Open-Meteo
+    if departure.tzinfo is None:
+        departure = departure.replace(tzinfo=timezone.utc)
+    return int(departure.timestamp())
+
+
+def _aggregate_arrays(weather: HourlyWeather) -> dict:
+    if len(weather.time) == 0:
+        return _empty_weather()
+
+    return {
+        "wind_max_1h": _reduce(weather.windspeed_10m, np.max, np.nanmax),
+        "cloud_mean_1h": _reduce(weather.cloudcover, np.mean, np.nanmean),
+        "rain_sum_1h": _reduce(weather.rain, np.sum, np.nansum),
+        "snow_sum_1h": _reduce(weather.snowfall, np.sum, np.nansum),
+    }
+
+
+def _reduce(values: np.ndarray, reduction, nan_reduction) -> float:
+    # A variante nan* (que ignora ausentes, como o pandas) só é usada se houver NaN, pois é mais lenta
+    result = reduction(values)
+    # Tudo nulo fica NaN (sem o aviso "All-NaN slice" do NumPy) e é tratado por _without_nan
+    if np.isnan(result) and not np.isnan(values).all():
+        result = nan_reduction(values)
+    return float(result)
+
+
+def _empty_weather(window_hours: int = 1) -> dict:
+    return {
+        f"wind_max_{window_hours}h": 0.0,
+        f"cloud_mean_{window_hours}h": 0.0,
+        f"rain_sum_{window_hours}h": 0.0,
+        f"snow_sum_{window_hours}h": 0.0,
     }
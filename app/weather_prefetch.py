@@ -0,0 +1,60 @@
+import asyncio
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable
+from app.weather_service import WeatherService
+
+
+class WeatherPrefetcher:
+    """
+    Tarefa em segundo plano que atualiza periodicamente o clima horário de um conjunto de aeroportos,
+    alimentando o mesmo cache lido por enrich_with_weather (via WeatherService).
+    """
+
+    def __init__(self, weather_service: WeatherService, airport_codes: Callable[[], Iterable[str]],
+                 interval: float = 900, hours_ahead: int = 2):
+        self.weather_service = weather_service
+        self.airport_codes = airport_codes
+        self.interval = interval
+        self.hours_ahead = hours_ahead
+        self.last_refresh = None
+        self.last_errors = 0
+        self.last_unknown = []
+
+    async def run(self):
+        """Executa refresh() a cada interval segundos até ser cancelada."""
+        while True:
+            try:
+                await self.refresh()
+            except Exception as exc:
+                print(f"Erro no pré-carregamento do clima: {exc}")
+                print(traceback.format_exc())
+            await asyncio.sleep(self.interval)
+
+    async def refresh(self):
+        """
+        Busca o clima da hora atual e das próximas hours_ahead horas para cada aeroporto.
+        Códigos fora da tabela de aeroportos são ignorados (e registrados) sem interromper os demais.
+        """
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        hours = [now + timedelta(hours=offset) for offset in range(self.hours_ahead + 1)]
+
+        airport_service = self.weather_service.airport_service
+        codes, unknown = [], []
+        for code in self.airport_codes():
+            (codes if airport_service.is_known(code) else unknown).append(code)
+        if unknown:
+            print(f"Aeroportos desconhecidos ignorados no pré-carregamento do clima: {', '.join(unknown)}")
+        self.last_unknown = unknown
+
+        requests = [(code, hour) for code in codes for hour in hours]
+
+        # Uma chamada multi-localização por janela de datas
+        results = await self.weather_service.get_weather_features_bulk(requests, refresh=True, fallback=False)
+
+        failed = sorted({code for (code, _), features in zip(requests, results) if features is None})
+        if failed:
+            print(f"Falha ao pré-carregar o clima de: {', '.join(failed)}")
+
+        self.last_refresh = now
+        self.last_errors = len(failed)
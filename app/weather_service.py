@@ -0,0 +1,250 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from app import metrics
+from app.airport_service import AirportService
+from app.cache import TTLCache
+from app.shared_weather_store import SharedWeatherStore
+from app.weather_client import AsyncWeatherClient
+from app.weather_features import aggregate_weather_window, climatology_weather
+
+
+def to_utc(departure: datetime) -> datetime:
+    """Converte a partida para UTC. Datas sem fuso são tratadas como UTC, como na consulta à Open-Meteo."""
+    if departure.tzinfo is None:
+        return departure.replace(tzinfo=timezone.utc)
+    return departure.astimezone(timezone.utc)
+
+
+def weather_cache_key(cell: Tuple[float, float], departure: datetime) -> tuple:
+    """Chave do cache meteorológico: (ponto da grade do clima (lat, lon), hora UTC da partida)."""
+    hour = to_utc(departure).replace(minute=0, second=0, microsecond=0)
+    return (cell, hour)
+
+
+class DegradedWeather(dict):
+    """
+    Features meteorológicas servidas sem consulta bem-sucedida à Open-Meteo. source indica a origem:
+    "ultimo_conhecido" (último clima obtido para o aeroporto) ou "climatologia" (valores típicos).
+    """
+
+    def __init__(self, features: dict, source: str):
+        super().__init__(features)
+        self.source = source
+
+
+def is_degraded(weather_features) -> bool:
+    return isinstance(weather_features, DegradedWeather)
+
+
+class WeatherService:
+    """
+    Camada de cache em memória na frente do cliente meteorológico.
+    Armazena o resultado já agregado de aggregate_weather_window por (ponto da grade, hora UTC);
+    as janelas terminam na partida e são iguais para qualquer partida dentro da mesma hora. O ponto
+    da grade vem de AirportService.weather_cell: aeroportos na mesma célula compartilham a entrada
+    e a consulta à Open-Meteo, feita nas coordenadas do ponto da grade.
+
+    Requisições simultâneas deste worker pela mesma chave esperam uma única busca em andamento. Com
+    shared_store, as ausências no cache em memória são procuradas no cache compartilhado entre os
+    workers do host, e a consulta de cada chave à Open-Meteo é feita por um único worker (os demais
+    esperam o resultado; ver SharedWeatherStore).
+
+    Se a consulta falhar (Open-Meteo fora do ar, deadline estourado ou circuito aberto) e fallback=True,
+    serve as últimas features obtidas para a mesma chave (ponto da grade, hora UTC), mesmo já expiradas
+    no cache, desde que obtidas há no máximo stale_max_age segundos; sem elas, os valores climatológicos.
+    Ambos vêm como DegradedWeather e não vão para o cache: a próxima consulta tenta de novo.
+    """
+
+    def __init__(self, airport_service: AirportService, weather_client: AsyncWeatherClient, cache: TTLCache,
+                 shared_store: Optional[SharedWeatherStore] = None, stale_max_age: float = 21600):
+        self.airport_service = airport_service
+        self.weather_client = weather_client
+        self.cache = cache
+        self.shared_store = shared_store
+        # Buscas em andamento neste worker por chave: requisições simultâneas esperam a mesma busca
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        # Últimas features obtidas por chave, guardadas além do TTL do cache (até stale_max_age), para o fallback
+        self.last_known = TTLCache(ttl=stale_max_age, maxsize=cache.maxsize)
+
+    def cache_key(self, airport_code: str, departure: datetime) -> tuple:
+        return weather_cache_key(self.airport_service.weather_cell(airport_code), departure)
+
+    async def get_weather_features(self, airport_code: str, departure: datetime, refresh: bool = False,
+                                   fallback: bool = True) -> Optional[dict]:
+        """
+        Retorna as features meteorológicas agregadas do aeroporto na hora da partida.
+        Com refresh=True ignora o cache e busca novamente na Open-Meteo (usado pelo pré-carregamento).
+        Se a consulta falhar, retorna o fallback (DegradedWeather) ou, com fallback=False, None.
+        """
+        key = self.cache_key(airport_code, departure)
+        if not refresh:
+            features = self.cache.get(key)
+            if features is not None:
+                return features
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            # Outra requisição deste worker já está buscando esta chave
+            features = await asyncio.shield(pending)
+        else:
+            future = self._begin([key])[key]
+            features = None
+            try:
+                features = await self._fetch_one(key, departure, refresh)
+            finally:
+                self._finish({key: future}, {key: features} if features is not None else {})
+
+        if features is None:
+            return self.fallback(key) if fallback else None
+        return features
+
+    async def _fetch_one(self, key: tuple, departure: datetime, refresh: bool) -> Optional[dict]:
+        # Cache compartilhado (ou o worker que detém a concessão) e, sem ele, a Open-Meteo; None se falhar
+        shared = self.shared_store
+        leased = False
+        if shared is not None:
+            max_age = shared.refresh_grace if refresh else None
+            features = await shared.get(key, max_age)
+            if features is None:
+                leased = key in await shared.acquire_many([key])
+                if not leased:
+                    # Outro worker já está consultando esta chave
+                    features = await shared.wait(key, max_age)
+            if features is not None:
+                self._store(key, features)
+                return features
+
+        try:
+            lat, lon = key[0]
+            weather = await self.weather_client.get_weather_1h(lat, lon, to_utc(departure))
+            # Horas da janela sem dado (valores nulos da Open-Meteo) contam como consulta que falhou
+            features = aggregate_weather_window(weather, departure) if weather is not None else None
+            if features is not None:
+                self._store(key, features)
+                if shared is not None:
+                    await shared.set_many({key: features})
+            return features
+        finally:
+            if leased:
+                await shared.release_many([key])
+
+    def _begin(self, keys: List[tuple]) -> Dict[tuple, asyncio.Future]:
+        # Registra as buscas em andamento deste worker, que as outras requisições esperam
+        loop = asyncio.get_running_loop()
+        futures = {key: loop.create_future() for key in keys}
+        self._inflight.update(futures)
+        return futures
+
+    def _finish(self, futures: Dict[tuple, asyncio.Future], fetched: Dict[tuple, dict]):
+        # Entrega o resultado (None se a busca falhou) a quem esperava e remove as buscas em andamento
+        for key, future in futures.items():
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            if not future.done():
+                future.set_result(fetched.get(key))
+
+    def fallback(self, key: tuple) -> DegradedWeather:
+        """Clima degradado de uma chave: o último obtido para ela (até stale_max_age) ou, sem ele, o climatológico."""
+        last_known = self.last_known.get(key)
+        if last_known is not None:
+            source, features = "ultimo_conhecido", last_known
+        else:
+            source, features = "climatologia", climatology_weather()
+        metrics.WEATHER_FALLBACKS.inc(source=source)
+        return DegradedWeather(features, source)
+
+    def _store(self, key: tuple, features: dict):
+        # Cache em memória deste worker; a gravação no cache compartilhado é feita em lote por quem buscou
+        self.cache.set(key, features)
+        self.last_known.set(key, features)
+
+    async def get_weather_features_bulk(self, requests: List[Tuple[str, datetime]], refresh: bool = False,
+                                        fallback: bool = True) -> List[Optional[dict]]:
+        """
+        Versão em lote de get_weather_features para vários (aeroporto, partida).
+        As ausências no cache que já estão sendo buscadas por outra requisição deste worker esperam essa
+        busca; as demais são procuradas no cache compartilhado (se houver) e buscadas com
+        get_weather_1h_bulk (uma chamada por janela de datas).
+        As consultas que falharam recebem o fallback (DegradedWeather) ou, com fallback=False, None;
+        em nenhum caso são armazenadas no cache.
+        """
+        keys = [self.cache_key(code, departure) for code, departure in requests]
+        results = [None] * len(requests)
+        missing = {}
+
+        for index, key in enumerate(keys):
+            features = None if refresh else self.cache.get(key)
+            if features is not None:
+                results[index] = features
+            else:
+                missing.setdefault(key, []).append(index)
+
+        if not missing:
+            return results
+
+        pending = {key: self._inflight[key] for key in missing if key in self._inflight}
+        futures = self._begin([key for key in missing if key not in pending])
+        fetched = {}
+        try:
+            fetched = await self._fetch_many(list(futures), refresh)
+        finally:
+            self._finish(futures, fetched)
+        if pending:
+            fetched.update((key, features) for key, features in
+                           zip(pending, await asyncio.gather(*(asyncio.shield(future) for future in pending.values())))
+                           if features is not None)
+
+        for key, indices in missing.items():
+            features = fetched.get(key)
+            if features is None:
+                if not fallback:
+                    continue
+                features = self.fallback(key)
+            for index in indices:
+                results[index] = features
+        return results
+
+    async def _fetch_many(self, keys: List[tuple], refresh: bool) -> Dict[tuple, dict]:
+        # Features das chaves vindas do cache compartilhado, de outro worker ou da Open-Meteo (só as obtidas)
+        shared = self.shared_store
+        if shared is None or not keys:
+            return await self._fetch_upstream(keys)
+
+        max_age = shared.refresh_grace if refresh else None
+        fetched = await shared.get_many(keys, max_age)
+        for key, features in fetched.items():
+            self._store(key, features)
+
+        # Consulta as chaves cuja concessão obteve e espera as demais, consultadas por outro worker
+        rest = [key for key in keys if key not in fetched]
+        leased = await shared.acquire_many(rest)
+        try:
+            fetched.update(await self._fetch_upstream([key for key in rest if key in leased]))
+        finally:
+            await shared.release_many(leased)
+
+        waiting = [key for key in rest if key not in leased]
+        if waiting:
+            received = await shared.wait_many(waiting, max_age)
+            for key, features in received.items():
+                self._store(key, features)
+            fetched.update(received)
+            # Sem resultado do outro worker (falha ou concessão expirada), consulta por conta própria
+            fetched.update(await self._fetch_upstream([key for key in waiting if key not in received]))
+        return fetched
+
+    async def _fetch_upstream(self, keys: List[tuple]) -> Dict[tuple, dict]:
+        # Busca as chaves (ponto da grade, hora UTC) na Open-Meteo e grava as obtidas nos caches
+        if not keys:
+            return {}
+
+        points = [(lat, lon, hour) for (lat, lon), hour in keys]
+        results = await self.weather_client.get_weather_1h_bulk(points)
+
+        fetched = {key: features for key, features in zip(keys, results) if features is not None}
+        for key, features in fetched.items():
+            self._store(key, features)
+        if self.shared_store is not None:
+            await self.shared_store.set_many(fetched)
+        return fetched
@@ -0,0 +1,88 @@
+"""
+Servidor local que imita o endpoint /v1/forecast da Open-Meteo (formato JSON, timeformat=unixtime),
+com latência e taxa de erro configuráveis. Usado pelo teste de carga para medir a API sem rede.
+
+    python -m benchmarks.fake_open_meteo --port 8099 --latency-ms 50 --error-rate 0.01
+
+A API passa a usá-lo com OPEN_METEO_URL=http://127.0.0.1:8099/v1/forecast. Só o cliente assíncrono
+(JSON) é suportado; o WeatherClient síncrono usa o formato flatbuffers do openmeteo_requests.
+"""
+import argparse
+import asyncio
+import os
+import random
+import zlib
+from datetime import date
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+LATENCY_MS = float(os.environ.get("FAKE_OPEN_METEO_LATENCY_MS", "50"))
+ERROR_RATE = float(os.environ.get("FAKE_OPEN_METEO_ERROR_RATE", "0"))
+SEED = int(os.environ.get("FAKE_OPEN_METEO_SEED", "0"))
+
+app = FastAPI()
+_errors = random.Random(SEED)
+stats = {"requests": 0, "errors": 0, "locations": 0}
+
+
+def location_payload(lat: str, lon: str, start_date: str, end_date: str) -> dict:
+    """Série horária determinística (mesma localização e datas -> mesmos valores)."""
+    start = date.fromisoformat(start_date)
+    n_hours = ((date.fromisoformat(end_date) - start).days + 1) * 24
+    start_ts = (start - date(1970, 1, 1)).days * 86400
+    rng = np.random.default_rng(zlib.crc32(f"{lat},{lon},{start_date}".encode()))
+    return {
+        "latitude": float(lat),
+        "longitude": float(lon),
+        "hourly": {
+            "time": list(range(start_ts, start_ts + n_hours * 3600, 3600)),
+            "windspeed_10m": rng.uniform(0, 40, n_hours).round(1).tolist(),
+            "cloudcover": rng.uniform(0, 100, n_hours).round(0).tolist(),
+            "rain": rng.exponential(0.2, n_hours).round(1).tolist(),
+            "snowfall": [0.0] * n_hours,
+        },
+    }
+
+
+@app.get("/v1/forecast")
+async def forecast(request: Request):
+    stats["requests"] += 1
+    if LATENCY_MS > 0:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if _errors.random() < ERROR_RATE:
+        stats["errors"] += 1
+        return JSONResponse({"error": True, "reason": "erro simulado"}, status_code=503)
+
+    q = request.query_params
+    lats, lons = q["latitude"].split(","), q["longitude"].split(",")
+    stats["locations"] += len(lats)
+    payloads = [location_payload(lat, lon, q["start_date"], q["end_date"]) for lat, lon in zip(lats, lons)]
+    # Como a Open-Meteo: lista com várias localizações, objeto com uma só
+    return payloads if len(payloads) > 1 else payloads[0]
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+def main():
+    global LATENCY_MS, ERROR_RATE, _errors
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE)
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+
+    LATENCY_MS, ERROR_RATE = args.latency_ms, args.error_rate
+    _errors = random.Random(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Teste de carga ponta a ponta: sobe o servidor falso da Open-Meteo (benchmarks/fake_open_meteo.py) e a API
+com uvicorn, dispara requisições concorrentes e reporta a vazão e as latências p50/p95/p99.
+
+    python -m benchmarks.load_test --requests 2000 --concurrency 50 --latency-ms 50 --error-rate 0.01
+    python -m benchmarks.load_test --batch-size 20 --output resultados/carga.json
+
+Os voos são sorteados (semente fixa) entre os aeroportos de data/airports_lat_lon.csv e as companhias de
+data/ops_airline.csv; --distinct-flights controla quantos voos distintos existem e, portanto, a taxa
+de acerto do cache meteorológico. Com --app-url a carga vai para uma API já em execução (que deve
+usar OPEN_METEO_URL apontando para o servidor falso).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+import httpx
+import numpy as np
+import pandas as pd
+from app.reference_tables import BASE_DIR, DATA_DIR
+
+START_DATE = datetime(2025, 11, 10)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_process(args: list, env: dict = None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=BASE_DIR, env={**os.environ, **(env or {})})
+
+
+def wait_until_up(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} não respondeu em {timeout:.0f}s")
+
+
+def sample_flights(n_flights: int, seed: int) -> list:
+    """Voos distintos sorteados a partir dos dados de referência (mesma semente -> mesmos voos)."""
+    rng = random.Random(seed)
+    airports = pd.read_csv(DATA_DIR / "airports_lat_lon.csv")["airport_code"].astype(str).tolist()
+    airlines = pd.read_csv(DATA_DIR / "ops_airline.csv")["airline"].astype(str).tolist()
+
+    flights = []
+    for _ in range(n_flights):
+        origem, destino = rng.sample(airports, 2) if len(airports) > 1 else (airports[0], airports[0])
+        departure = START_DATE + timedelta(minutes=rng.randrange(0, 7 * 24 * 60, 5))
+        flights.append({
+            "companhia": rng.choice(airlines),
+            "origem": origem,
+            "destino": destino,
+            "data_partida": departure.isoformat(),
+        })
+    return flights
+
+
+async def run_load(app_url: str, flights: list, n_requests: int, concurrency: int, batch_size: int, seed: int) -> dict:
+    rng = random.Random(seed + 1)
+    if batch_size > 0:
+        url = f"{app_url}/api/predict/batch"
+        bodies = [[rng.choice(flights) for _ in range(batch_size)] for _ in range(n_requests)]
+    else:
+        url = f"{app_url}/api/predict/"
+        bodies = [rng.choice(flights) for _ in range(n_requests)]
+
+    latencies = []
+    statuses = Counter()
+    queue = iter(bodies)
+
+    async def worker(client: httpx.AsyncClient):
+        for body in queue:
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json=body)
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as exc:
+                statuses[type(exc).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    ok = statuses.get(201, 0)
+    return {
+        "requisicoes": n_requests,
+        "voos_por_requisicao": max(batch_size, 1),
+        "concorrencia": concurrency,
+        "duracao_s": elapsed,
+        "vazao_rps": n_requests / elapsed,
+        "vazao_voos_s": ok * max(batch_size, 1) / elapsed,
+        "status": {str(status): count for status, count in statuses.items()},
+        "latencia_ms": {
+            "p50": float(np.percentile(latencies_ms, 50)),
+            "p95": float(np.percentile(latencies_ms, 95)),
+            "p99": float(np.percentile(latencies_ms, 99)),
+            "max": float(latencies_ms.max()),
+        },
+    }
+
+
+def print_report(result: dict):
+    latency = result["latencia_ms"]
+    print(f"requisições:   {result['requisicoes']} ({result['voos_por_requisicao']} voo(s) cada), concorrência {result['concorrencia']}")
+    print(f"duração:       {result['duracao_s']:.2f} s")
+    print(f"vazão:         {result['vazao_rps']:.1f} req/s ({result['vazao_voos_s']:.1f} voos/s)")
+    print(f"latência (ms): p50 {latency['p50']:.1f}  p95 {latency['p95']:.1f}  p99 {latency['p99']:.1f}  max {latency['max']:.1f}")
+    print(f"status:        {result['status']}")
+    if "open_meteo" in result:
+        print(f"open-meteo:    {result['open_meteo']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=0, help="voos por requisição em /batch (0: rota individual)")
+    parser.add_argument("--distinct-flights", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=100, help="requisições descartadas antes da medição")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="latência do servidor falso da Open-Meteo")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 503 do servidor falso")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--app-url", help="usa uma API já em execução em vez de subir uma")
+    parser.add_argument("--output", help="grava os resultados em JSON (para comparar entre commits)")
+    args = parser.parse_args()
+
+    processes = []
+    fake_url = None
+    temp_dir = tempfile.TemporaryDirectory(prefix="load_test_")
+    try:
+        app_url = args.app_url
+        if app_url is None:
+            fake_port, app_port = free_port(), free_port()
+            fake_url = f"http://127.0.0.1:{fake_port}"
+            processes.append(start_process([
+                "-m", "benchmarks.fake_open_meteo", "--port", str(fake_port),
+                "--latency-ms", str(args.latency_ms), "--error-rate", str(args.error_rate), "--seed", str(args.seed),
+            ]))
+            wait_until_up(f"{fake_url}/stats")
+
+            app_url = f"http://127.0.0.1:{app_port}"
+            processes.append(start_process(
+                ["-m", "uvicorn", "app.main:app", "--port", str(app_port), "--log-level", "warning", "--no-access-log"],
+                env={"OPEN_METEO_URL": f"{fake_url}/v1/forecast", "WEATHER_PREFETCH_AIRPORTS": "", "REFERENCE_RELOAD_INTERVAL": "0",
+                     # cache compartilhado novo a cada execução: as medições não reaproveitam o clima de outra
+                     "WEATHER_SHARED_CACHE_PATH": os.path.join(temp_dir.name, "weather.sqlite")},
+            ))
+            wait_until_up(f"{app_url}/ready")
+
+        flights = sample_flights(args.distinct_flights, args.seed)
+        if args.warmup > 0:
+            asyncio.run(run_load(app_url, flights, args.warmup, args.concurrency, args.batch_size, args.seed + 100))
+
+        result = asyncio.run(run_load(app_url, flights, args.requests, args.concurrency, args.batch_size, args.seed))
+        result["parametros"] = vars(args)
+        if fake_url is not None:
+            result["open_meteo"] = httpx.get(f"{fake_url}/stats").json()
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+        temp_dir.cleanup()
+
+    print_report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Micro-benchmarks das etapas da previsão, sem rede: features base, taxas de cancelamento,
+agregação meteorológica e inferência do modelo. Usa os CSVs de data/ e o artefato de model/.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --repeat 7 --output resultados/micro.json
+
+Para cada função mede `repeat` rodadas de `number` chamadas e reporta o tempo por chamada
+(mínimo e mediana das rodadas), em microssegundos.
+"""
+import argparse
+import json
+import statistics
+import timeit
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from app.cancel_rate import CancellationRate
+from app.features import build_base_features, enrich_with_cancellation_rates, build_features
+from app.model import FlightDelayModel
+from app.reference_tables import DATA_DIR
+from app.schemas import FlightInput
+from app.weather_features import HourlyWeather, aggregate_weather_1h, aggregate_weather_window
+
+# Em UTC, como aggregate_weather_window trata as datas sem fuso: .timestamp() não depende do fuso do host
+DEPARTURE = datetime(2025, 11, 10, 14, 30, tzinfo=timezone.utc)
+
+
+def sample_input() -> FlightInput:
+    return FlightInput(companhia="AZ", origem="GIG", destino="GRU", data_partida=DEPARTURE)
+
+
+def sample_weather(hours: int = 48) -> HourlyWeather:
+    """Dois dias de dados horários, como retornados pela Open-Meteo para uma partida."""
+    rng = np.random.default_rng(0)
+    start = int((DEPARTURE - timedelta(hours=DEPARTURE.hour, minutes=DEPARTURE.minute) - timedelta(days=1)).timestamp())
+    return HourlyWeather(
+        time=np.arange(start, start + hours * 3600, 3600, dtype=np.int64),
+        windspeed_10m=rng.uniform(0, 40, hours).astype(np.float32),
+        cloudcover=rng.uniform(0, 100, hours).astype(np.float32),
+        rain=rng.exponential(0.2, hours).astype(np.float32),
+        snowfall=np.zeros(hours, dtype=np.float32),
+    )
+
+
+def benchmarks():
+    """(nome, função sem argumentos) de cada micro-benchmark."""
+    flight = sample_input()
+    weather = sample_weather()
+    cancellation_service = CancellationRate(
+        airline_csv_file_path=DATA_DIR / "ops_airline.csv",
+        origin_csv_file_path=DATA_DIR / "ops_origin.csv",
+        route_csv_file_path=DATA_DIR / "ops_route.csv",
+    )
+    model = FlightDelayModel()
+    base_features = build_base_features(flight)
+    features = build_features(flight, cancellation_service, weather)
+
+    return [
+        ("build_base_features", lambda: build_base_features(flight)),
+        ("enrich_with_cancellation_rates", lambda: enrich_with_cancellation_rates(dict(base_features), cancellation_service)),
+        ("aggregate_weather_1h", lambda: aggregate_weather_1h(weather)),
+        ("aggregate_weather_window", lambda: aggregate_weather_window(weather, DEPARTURE)),
+        ("FlightDelayModel.predict", lambda: model.predict(features)),
+    ]
+
+
+def measure(func, repeat: int, number: int = 0) -> dict:
+    timer = timeit.Timer(func)
+    if number <= 0:
+        # Chamadas suficientes para uma rodada de ~0,2 s
+        number, _ = timer.autorange()
+    per_call = [total / number * 1e6 for total in timer.repeat(repeat=repeat, number=number)]
+    return {"chamadas": number, "min_us": min(per_call), "mediana_us": statistics.median(per_call)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="rodadas por função")
+    parser.add_argument("--number", type=int, default=0, help="chamadas por rodada (0: automático)")
+    parser.add_argument("--filter", default="", help="roda só os benchmarks cujo nome contém este texto")
+    parser.add_argument("--output", help="grava os resultados em JSON (para comparar entre commits)")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'benchmark':<32}{'min (us)':>12}{'mediana (us)':>14}{'chamadas':>10}")
+    for name, func in benchmarks():
+        if args.filter not in name:
+            continue
+        results[name] = measure(func, args.repeat, args.number)
+        r = results[name]
+        print(f"{name:<32}{r['min_us']:>12.2f}{r['mediana_us']:>14.2f}{r['chamadas']:>10}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
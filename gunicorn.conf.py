@@ -0,0 +1,33 @@
+# Modo de produção com vários workers: gunicorn -c gunicorn.conf.py app.main:app
+#
+# Com preload_app, o processo pai importa app.main e, em when_ready, carrega e aquece modelo, aeroportos
+# e taxas de cancelamento uma única vez (routers.load_services); os workers são criados por fork já
+# prontos, compartilhando essa memória por copy-on-write, então um worker novo atende em milissegundos.
+import gc
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+# Cada worker carrega o próprio event loop, pool de threads e caches: o número de CPUs do host (ou do
+# nó, dentro de um contêiner) não é uma boa estimativa. Defina WEB_CONCURRENCY em cada implantação,
+# de acordo com a CPU e a memória reservadas; sem ela, usa um padrão conservador
+DEFAULT_WORKERS = 2
+workers = int(os.environ.get("WEB_CONCURRENCY", DEFAULT_WORKERS))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = int(os.environ.get("WORKER_TIMEOUT", "60"))
+
+
+def when_ready(server):
+    from app.routers import load_services
+    from app.startup import startup
+
+    if "WEB_CONCURRENCY" not in os.environ:
+        server.log.warning("WEB_CONCURRENCY não definido: usando %s workers (defina-o para esta implantação)", workers)
+    load_services()
+    server.log.info("Serviços carregados no processo pai (%s)", startup.summary())
+
+    # Move os objetos já carregados para a geração permanente do GC: as coletas nos workers
+    # deixam de percorrê-los (e de escrever nos seus cabeçalhos), o que preservaria o
+    # compartilhamento copy-on-write das páginas herdadas do processo pai
+    gc.freeze()
+    server.log.info("%s objetos congelados para o GC", gc.get_freeze_count())